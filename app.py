@@ -1,71 +1,424 @@
 # app.py
 
+import abc
+import atexit
+import bisect
+import functools
+import gzip
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import math
+import mimetypes
+import os
+import pickle
+import queue
+import re
+import secrets
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from collections import Counter
+from contextlib import nullcontext
+from dataclasses import dataclass, field
 from pathlib import Path
 from collections import OrderedDict
+from types import MappingProxyType
+from typing import Callable, Mapping
 
-import pandas as pd
+import numpy as np
 from flask import (
     Flask, render_template, request,
-    jsonify, url_for, session, redirect
+    jsonify, url_for, session, redirect, g, has_request_context,
+    before_render_template, template_rendered, send_file
 )
+from flask.sessions import SecureCookieSessionInterface
+from werkzeug.exceptions import NotFound, RequestEntityTooLarge
+from werkzeug.security import safe_join
+from jinja2.utils import htmlsafe_json_dumps
+from markupsafe import Markup
 # near the top of app.py
 from datetime import datetime
 
 
 
 # -----------------------------------------------------------------------------
-# Configuration & data load
+# Configuration
 # -----------------------------------------------------------------------------
 DATA_FILE = Path(__file__).parent / "privacy.xlsx"
-df = pd.read_excel(DATA_FILE)
 
-deal_col = next(
-    (c for c in df.columns if "deal" in c.lower()), 
-    None
-)
+# Compiled, pickled form of DATA_FILE (see `python cli.py compile`). Workers
+# load this instead of parsing the spreadsheet, so pandas/openpyxl are only
+# imported when the snapshot is missing or stale.
+SNAPSHOT_FILE = DATA_FILE.with_suffix(".snapshot")
+SNAPSHOT_FORMAT = 5     # bump whenever the layout of compile_rules() changes
+
+# Declarative implementation wizards (steps, routing keywords, output rules).
+# The snapshot's tool-routing table is built from it, so it is part of the
+# snapshot's freshness check too.
+WIZARD_FILE = Path(__file__).parent / "wizards.json"
+
+# Rankings precomputed offline for common answer sets (`python cli.py
+# precompute`). Served ahead of the evaluation cache while its rules version
+# matches the sheet's; ignored otherwise.
+PRECOMPUTED_FILE = DATA_FILE.with_suffix(".answers")
+PRECOMPUTED_FORMAT = 1
+
+# Minified, content-hashed copies of static/ (`python cli.py build-assets`).
+# url_for('static', ...) points at them while their sources are unchanged;
+# otherwise the plain files are served as before.
+ASSET_DIR = Path(__file__).parent / "static" / "dist"
+ASSET_MANIFEST = ASSET_DIR / "manifest.json"
+ASSET_BUNDLES = {       # served name -> source files, concatenated in order
+    "styles.css": ("styles.css",),
+    "main.js": ("main.js",),
+}
+ASSET_MAX_AGE = 365 * 24 * 3600     # seconds; hashed names never change content
+# Let the front-end proxy (nginx X-Accel / Apache X-Sendfile) send files.
+X_SENDFILE = os.environ.get("PETS_X_SENDFILE", "") not in ("", "0")
+
+# Extra, named rule sets served under /<name>/...: one <name>.xlsx (or just
+# a compiled <name>.snapshot) per questionnaire in this directory. Loaded on
+# first use; the least recently used are dropped past the memory budget.
+RULESET_DIR = Path(os.environ["PETS_RULESETS"]) if os.environ.get("PETS_RULESETS") else None
+RULESET_BUDGET = int(os.environ.get("PETS_RULESET_BUDGET", 64 * 1024 * 1024))   # bytes
+
+# Opt-in instrumentation (see "Instrumentation" below): per-stage latency
+# histograms on /metrics, plus stacks of the slowest requests on
+# /metrics/profile when PETS_PROFILE_SLOWEST > 0.
+METRICS_ENABLED = os.environ.get("PETS_METRICS", "") not in ("", "0")
+PROFILE_SLOWEST = int(os.environ.get("PETS_PROFILE_SLOWEST", 0))
+PROFILE_INTERVAL = float(os.environ.get("PETS_PROFILE_INTERVAL", 0.005))   # seconds
+
+# Append-only log of every POST /results submission and its ranking (see
+# "Submission log" below); set PETS_SUBMISSION_LOG= (empty) to turn it off.
+SUBMISSION_LOG = os.environ.get("PETS_SUBMISSION_LOG", str(Path(__file__).parent / "submissions.db"))
+
+# Set by `python bench.py startup` in the interpreters it times: every
+# stage() run while loading is kept, nested and in order, in BOOT_PHASES.
+STARTUP_TRACE = os.environ.get("PETS_STARTUP_TRACE", "") not in ("", "0")
 
-deal_map: dict[str, dict[str, list[str]]] = {}
-if deal_col:
-    for _, row in df.iterrows():
-        q = row["Question"].strip()
-        a = str(row["Answer Option"]).strip()
-        raw = row.get(deal_col, "")             # e.g. "MPC; Differential Privacy"
-        if pd.isna(raw) or not raw:
-            continue
-        pets = [p.strip() for p in str(raw).split(";") if p.strip()]
-        if pets:
-            deal_map.setdefault(q, {})[a] = pets
 
+# -----------------------------------------------------------------------------
+# Instrumentation
+# -----------------------------------------------------------------------------
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    # Prometheus-style histogram with one label. Every thread writes to its
+    # own shard, so observe() only locks to register a thread's shard on its
+    # first call; a scrape sums the shards and folds those of finished
+    # threads into `_retired`.
+
+    def __init__(self, name: str, help: str, label: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        self._local = threading.local()
+        self._shards: list[tuple[threading.Thread, dict]] = []
+        self._retired: dict[str, list] = {}
+        self._lock = threading.Lock()   # scrapes, and shard registration
+
+    def _new_cell(self):
+        return [0] * (len(self.buckets) + 1) + [0.0]   # bucket counts, +Inf, sum
+
+    def observe(self, value: str, seconds: float):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+        cell = shard.get(value)
+        if cell is None:
+            cell = shard[value] = self._new_cell()
+        cell[bisect.bisect_left(self.buckets, seconds)] += 1
+        cell[-1] += seconds
+
+    def _merge(self, into: dict, shard: dict):
+        for value, cell in list(shard.items()):
+            total = into.setdefault(value, self._new_cell())
+            for i, n in enumerate(cell):
+                total[i] += n
+
+    def expose(self) -> list[str]:
+        with self._lock:
+            live = []
+            for thread, shard in list(self._shards):
+                if thread.is_alive():
+                    live.append((thread, shard))
+                else:
+                    self._merge(self._retired, shard)
+            self._shards[:] = live
+            totals: dict[str, list] = {}
+            self._merge(totals, self._retired)
+            for _, shard in live:
+                self._merge(totals, shard)
+
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for value, cell in sorted(totals.items()):
+            label = f'{self.label}="{value}"'
+            running = 0
+            for bound, n in zip(self.buckets, cell):
+                running += n
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {running}')
+            running += cell[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {running}')
+            lines.append(f"{self.name}_sum{{{label}}} {cell[-1]:.6f}")
+            lines.append(f"{self.name}_count{{{label}}} {running}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram("pets_request_seconds", "Request latency by endpoint.", "endpoint")
+STAGE_SECONDS = Histogram("pets_stage_seconds", "Time spent per processing stage.", "stage")
+
+
+class _Stage:
+    __slots__ = ("name", "t0")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, *exc):
+        STAGE_SECONDS.observe(self.name, time.perf_counter() - self.t0)
+
+
+class _TracedStage(_Stage):
+    __slots__ = ("entry",)
+    depth = 0
+
+    def __enter__(self):
+        self.entry = [self.name, _TracedStage.depth, 0.0]   # name, nesting, seconds
+        BOOT_PHASES.append(self.entry)
+        _TracedStage.depth += 1
+        super().__enter__()
+
+    def __exit__(self, *exc):
+        self.entry[2] = time.perf_counter() - self.t0
+        _TracedStage.depth -= 1
+        super().__exit__(*exc)
+
+
+_NO_STAGE = nullcontext()
+BOOT_PHASES: list[list] = []
+
+
+def stage(name: str):
+    # `with stage("evaluate"): …` — a shared no-op when metrics are off
+    if STARTUP_TRACE:
+        return _TracedStage(name)
+    return _Stage(name) if METRICS_ENABLED else _NO_STAGE
+
+
+def collapse_stack(frame) -> str:
+    # root-first "func (file);func (file);…", the folded format flamegraph.pl
+    # and speedscope read
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SlowRequestProfiler(threading.Thread):
+    # Samples the stacks of threads that are inside a request every
+    # `interval` seconds and keeps the samples of the `keep` slowest requests.
+
+    def __init__(self, keep: int, interval: float):
+        super().__init__(name="slow-request-profiler", daemon=True)
+        self.keep = keep
+        self.interval = interval
+        self.pid = os.getpid()
+        self.active: dict[int, Counter] = {}    # thread id → folded stacks
+        self.slowest: list[tuple] = []          # min-heap of (seconds, seq, label, stacks)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def begin(self):
+        self.active[threading.get_ident()] = Counter()
+
+    def end(self, label: str, seconds: float):
+        stacks = self.active.pop(threading.get_ident(), None)
+        if not stacks:
+            return
+        with self._lock:
+            item = (seconds, next(self._seq), label, stacks)
+            if len(self.slowest) < self.keep:
+                heapq.heappush(self.slowest, item)
+            elif seconds > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, item)
+
+    def run(self):
+        me = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            for tid, stacks in list(self.active.items()):
+                frame = frames.get(tid)
+                if frame is not None and tid != me:
+                    stacks[collapse_stack(frame)] += 1
+
+    def folded(self) -> str:
+        with self._lock:
+            slowest = sorted(self.slowest, reverse=True)
+        lines = []
+        for seconds, _, label, stacks in slowest:
+            root = f"{label} [{seconds * 1000:.1f}ms]".replace(";", ",")
+            lines.extend(f"{root};{stack} {n}" for stack, n in stacks.items())
+        return "\n".join(lines) + "\n"
+
+
+_profiler: SlowRequestProfiler | None = None
+_profiler_lock = threading.Lock()
+
+
+def ensure_profiler() -> SlowRequestProfiler | None:
+    global _profiler
+    if PROFILE_SLOWEST <= 0:
+        return None
+    if _profiler is None or _profiler.pid != os.getpid():
+        with _profiler_lock:
+            if _profiler is None or _profiler.pid != os.getpid():
+                _profiler = SlowRequestProfiler(PROFILE_SLOWEST, PROFILE_INTERVAL)
+                _profiler.start()
+    return _profiler
 
-# 1) Normalize question text (strip whitespace) so duplicates unify
-df["Question"] = df["Question"].astype(str).str.strip()
 
-# 2) Detect if a Parameter Suggestions column exists
-param_col = next(
-    (c for c in df.columns if c.lower().startswith("parameter suggestion")), 
-    None
+# -----------------------------------------------------------------------------
+# Tool routing: technique name → category + wizard
+# -----------------------------------------------------------------------------
+# One keyword table for both the results page (policy vs technique) and the
+# wizard, evaluated once per technique name at compile time; requests then
+# do a single dict lookup per PET (see route_tool()).
+POLICY_KEYWORDS = (
+    "compliance", "policy", "regulation",
+    "ferpa", "hipaa", "gdpr", "foia", "ccpa", "coppa"
 )
 
-# 3) Build fast lookup { question_text -> { answer_option -> {techs, params} } }
-lookup: dict[str, dict[str, dict]] = {}
-for _, row in df.iterrows():
-    q = row["Question"]
-    a = str(row["Answer Option"]).strip()
-
-    # Recommended Techniques → list of strings (safe split)
-    raw_techs = row.get("Recommended Techniques", "")
-    raw_techs = "" if pd.isna(raw_techs) else str(raw_techs)
-    techs = [t.strip() for t in raw_techs.split(";") if t.strip()]
-
-    # Parameter Suggestions → string or empty
-    params = ""
-    if param_col:
-        raw_params = row.get(param_col, "")
-        params = "" if pd.isna(raw_params) else str(raw_params)
-
-    lookup.setdefault(q, {})[a] = {
-        "techs": techs,
-        "params": params
+WIZARD_SPEC = json.loads(WIZARD_FILE.read_text(encoding="utf-8"))
+
+# first match wins: (substrings of the lowercased name, wizard display name)
+WIZARD_ROUTES = tuple(
+    (tuple(tool["match"]), name) for name, tool in WIZARD_SPEC.items()
+)
+
+
+def classify_tool(name: str) -> dict:
+    lowered = name.lower().strip()
+    category = "policy" if any(kw in lowered for kw in POLICY_KEYWORDS) else "technique"
+    wizard = next(
+        (display for keywords, display in WIZARD_ROUTES if any(kw in lowered for kw in keywords)),
+        None
+    )
+    return {"category": category, "wizard": wizard}
+
+
+def compile_routing(lookup: dict, deal_map: dict) -> dict[str, dict]:
+    names = {t for answers in lookup.values() for entry in answers.values() for t in entry["techs"]}
+    names |= {p for answers in deal_map.values() for pets in answers.values() for p in pets}
+    return {name: classify_tool(name) for name in sorted(names)}
+
+
+# -----------------------------------------------------------------------------
+# Compile the spreadsheet into rule tables
+# -----------------------------------------------------------------------------
+def read_sheet(path: Path = DATA_FILE) -> dict:
+    # Flatten the sheet to plain tuples:
+    #   (question, answer option, techniques cell, deal-breaker cell, params cell)
+    # with blank/NaN cells as "". This is the only code that needs pandas.
+    with stage("import_pandas"):
+        import pandas as pd     # heavy; only needed on the compile/fallback path
+
+    with stage("read_excel"):
+        df = pd.read_excel(path)
+
+    deal_col = next(
+        (c for c in df.columns if "deal" in c.lower()), 
+        None
+    )
+    # Detect if a Parameter Suggestions column exists
+    param_col = next(
+        (c for c in df.columns if c.lower().startswith("parameter suggestion")), 
+        None
+    )
+
+    def cell(record, col):
+        raw = record.get(col, "") if col else ""
+        return "" if pd.isna(raw) or not raw else str(raw)
+
+    rows = [
+        (
+            str(rec["Question"]).strip(),   # normalize so duplicates unify
+            rec["Answer Option"],
+            cell(rec, "Recommended Techniques"),
+            cell(rec, deal_col),            # e.g. "MPC; Differential Privacy"
+            cell(rec, param_col),
+        )
+        for rec in df.to_dict("records")
+    ]
+    return {"deal_col": deal_col, "param_col": param_col, "rows": rows}
+
+
+def parse_row(row: tuple) -> tuple[list[str], list[str]]:
+    _, _, raw_techs, raw_deal, _ = row
+    # interned, so each technique name exists once however many cells use it
+    techs = [sys.intern(t.strip()) for t in raw_techs.split(";") if t.strip()]
+    pets = [sys.intern(p.strip()) for p in raw_deal.split(";") if p.strip()]
+    return techs, pets
+
+
+def compile_rules(sheet: dict, parsed: dict = None) -> dict:
+    # `parsed` memoizes parse_row() by raw row content across rebuilds, so a
+    # hot reload only re-parses rows that actually changed. It is pruned to
+    # the current rows on the way out.
+    parsed = {} if parsed is None else parsed
+    seen = set()
+
+    deal_map: dict[str, dict[str, list[str]]] = {}
+    # { question_text -> { answer_option -> {techs, params} } }
+    lookup: dict[str, dict[str, dict]] = {}
+    with stage("lookup_deal_map"):      # one pass builds both
+        for row in sheet["rows"]:
+            q, answer, _, _, params = row
+            a = sys.intern(str(answer).strip())
+            params = sys.intern(params)
+            hit = parsed.get(row)
+            if hit is None:
+                hit = parsed[row] = parse_row(row)
+            seen.add(row)
+            techs, pets = hit
+
+            # Any PET listed as a deal-breaker is vetoed by this answer
+            if sheet["deal_col"] and pets:
+                deal_map.setdefault(q, {})[a] = pets
+            lookup.setdefault(q, {})[a] = {
+                "techs": techs,
+                "params": params
+            }
+
+    for stale in parsed.keys() - seen:
+        del parsed[stale]
+
+    with stage("build_questions"):
+        questions = build_questions(sheet["rows"])
+    with stage("routing"):
+        routing = compile_routing(lookup, deal_map)
+    return {
+        "deal_col":  sheet["deal_col"],
+        "param_col": sheet["param_col"],
+        "deal_map":  deal_map,
+        "lookup":    lookup,
+        "questions": questions,
+        "routing":   routing,
     }
 
 
@@ -73,19 +426,23 @@ for _, row in df.iterrows():
 # Build screening questions
 # -----------------------------------------------------------------------------
 
-def build_questions():
-    q_order = list(OrderedDict.fromkeys(df["Question"].tolist()))
-    grouped = df.groupby("Question")["Answer Option"].apply(list)
+def build_questions(rows):
+    # options per question, in sheet order (questions ordered by first row)
+    grouped: dict[str, list] = {}
+    for q_text, answer, *_ in rows:
+        grouped.setdefault(q_text, []).append(answer)
 
     questions = []
-    for idx, q_text in enumerate(q_order, start=1):
+    for idx, (q_text, options) in enumerate(grouped.items(), start=1):
         question = {
             "id":      f"q{idx}",
             "text":    q_text,
             "multi":   "select all" in q_text.lower() or "kind of data" in q_text.lower(),
-            "options": grouped[q_text]
+            "options": options
         }
-        # **only** Q4 depends on Q3=Real-time/interactive
+        # **only** Q4 depends on Q3=Real-time/interactive. The sheet spells
+        # that option with non-breaking hyphens, so as served q4 is never
+        # shown; `python cli.py precompute` models it the same way.
         if "If real-time or interactive results are needed" in q_text:
             question["depends_on"]    = "q3"
             question["depends_value"] = "Real-time/interactive"
@@ -95,225 +452,1909 @@ def build_questions():
     return questions
 
 
+# -----------------------------------------------------------------------------
+# Rule snapshot: build, save, load
+# -----------------------------------------------------------------------------
+def file_digest(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def build_snapshot(source: Path = DATA_FILE, parsed: dict = None) -> dict:
+    digest = file_digest(source)
+    return {
+        "format":  SNAPSHOT_FORMAT,
+        "source":  digest,
+        "wizards": file_digest(WIZARD_FILE),
+        "rules":   compile_rules(read_sheet(source), parsed),
+    }
+
+
+def write_snapshot(snapshot: dict, path: Path = SNAPSHOT_FILE):
+    # write-then-rename so a worker never sees a half-written file; the temp
+    # name is per process, as workers booting together may all write it
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as fh:
+        pickle.dump(snapshot, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+def read_snapshot(path: Path = SNAPSHOT_FILE):
+    # The snapshot is a local build artifact we wrote ourselves (never user
+    # input), so unpickling it is safe. Anything unreadable counts as missing.
+    try:
+        with open(path, "rb") as fh:
+            snapshot = pickle.load(fh)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get("format") != SNAPSHOT_FORMAT:
+        return None
+    return snapshot
+
+
+def load_snapshot(source: Path = DATA_FILE, path: Path = SNAPSHOT_FILE, persist: bool = True) -> dict:
+    with stage("read_snapshot"):
+        snapshot = read_snapshot(path)
+    if snapshot is not None and snapshot["wizards"] == file_digest(WIZARD_FILE):
+        # without the spreadsheet (snapshot-only deploys) trust the snapshot
+        if not source.exists() or snapshot["source"] == file_digest(source):
+            return snapshot
+    # missing or stale → compile straight from Excel
+    with stage("compile_sheet"):
+        snapshot = build_snapshot(source)
+    if persist:
+        # so the next boot (and every other worker) skips pandas and Excel
+        try:
+            write_snapshot(snapshot, path)
+        except OSError as exc:      # e.g. a read-only deploy directory
+            logging.getLogger(__name__).warning("could not save %s: %s", path, exc)
+    return snapshot
+
+
+
+# -----------------------------------------------------------------------------
+# Compiled question catalog (built once, shared by every request)
+# -----------------------------------------------------------------------------
+class Question:
+    # One record per question. Reads like the dict build_questions() made
+    # (q["text"], q.get("depends_on")), without a per-question dict.
+    __slots__ = ("id", "text", "multi", "options", "depends_on", "depends_value")
+
+    def __init__(self, id, text, multi, options, depends_on=None, depends_value=None):
+        self.id = id
+        self.text = text
+        self.multi = multi
+        self.options = tuple(options)
+        self.depends_on = depends_on
+        self.depends_value = depends_value
+
+    def __getitem__(self, key):
+        value = getattr(self, key, None) if key in self.__slots__ else None
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        value = getattr(self, key, None) if key in self.__slots__ else None
+        return default if value is None else value
+
+    def as_dict(self) -> dict:
+        q = {"id": self.id, "text": self.text, "multi": self.multi, "options": list(self.options)}
+        if self.depends_on:
+            q["depends_on"] = self.depends_on
+            q["depends_value"] = self.depends_value
+        return q
+
+
+@dataclass(frozen=True)
+class QuestionCatalog:
+    questions:  tuple                  # Question records, in sheet order
+    id_to_text: Mapping[str, str]      # "q1" -> question text
+    text_to_id: Mapping[str, str]      # question text -> "q1"
+    options:    Mapping[str, tuple]    # question text -> answer options
+    json:       str                    # serialized questions (API / ETag)
+    html_json:  Markup                 # same, escaped for a <script> tag
+    etag:       str
+
+    def as_list(self):
+        # fresh copies so callers can't mutate the shared catalog
+        return [q.as_dict() for q in self.questions]
+
+
+def compile_catalog(questions) -> QuestionCatalog:
+    frozen = tuple(Question(**q) for q in questions)
+    plain = [q.as_dict() for q in frozen]
+    payload = json.dumps(plain, ensure_ascii=False, separators=(",", ":"))
+    return QuestionCatalog(
+        questions=frozen,
+        id_to_text=MappingProxyType({q["id"]: q["text"] for q in frozen}),
+        text_to_id=MappingProxyType({q["text"]: q["id"] for q in frozen}),
+        options=MappingProxyType({q["text"]: q["options"] for q in frozen}),
+        json=payload,
+        html_json=htmlsafe_json_dumps(plain),
+        etag=hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32],
+    )
+
+
 
 # -----------------------------------------------------------------------------
 # Score screening answers
 # -----------------------------------------------------------------------------
-def evaluate(answers: dict):
-    votes = {}
-    params_out = []
-    vetoed = set()
-
-    # 1) Tally votes & collect params as before
-    for q_text, sel in answers.items():
-        sels = sel if isinstance(sel, list) else [sel]
-        for ans in sels:
-            entry = lookup.get(q_text, {}).get(ans)
-            if not entry: 
+class ScoringEngine:
+    # Interns every (question, answer) pair to a row id and every technique
+    # to a column id, so scoring walks small integer tables (one survey) or
+    # is one (surveys × answers) @ (answers × techniques) product (a batch)
+    # instead of repeated dict-of-dict string lookups.
+
+    # Strings (questions, answers, technique names) are held once, in
+    # row_key / techniques. The answer → technique and answer → veto
+    # relations are int32 CSR buffers: row r's techniques are
+    # vote_tech[vote_ptr[r]:vote_ptr[r + 1]], in cell order. They are the
+    # only resident form, so memory grows with the number of cells, not
+    # rows × techniques; scoring gathers just the rows it is given.
+
+    MATRICES = ("vote_ptr", "vote_tech", "veto_ptr", "veto_tech")
+
+    def __init__(self, lookup, deal_map):
+        self.techniques: list[str] = []
+        self.technique_id: dict[str, int] = {}
+        # { question_text -> { answer_option -> row } }
+        self.row_of: dict[str, dict[str, int]] = {}
+        self.row_key: list[tuple[str, str]] = []
+
+        def tech(name):
+            if name not in self.technique_id:
+                self.technique_id[name] = len(self.techniques)
+                self.techniques.append(name)
+            return self.technique_id[name]
+
+        def row(q, a):
+            rows = self.row_of.setdefault(q, {})
+            if a not in rows:
+                rows[a] = len(self.row_key)
+                self.row_key.append((q, a))
+            return rows[a]
+
+        vote_rows, veto_rows = {}, {}
+        for q, answers in lookup.items():
+            for a, entry in answers.items():
+                vote_rows[row(q, a)] = [tech(t) for t in entry["techs"]]
+        for q, answers in deal_map.items():
+            for a, pets in answers.items():
+                veto_rows[row(q, a)] = list(dict.fromkeys(tech(t) for t in pets))
+
+        n_rows = len(self.row_key)
+        self.vote_ptr, self.vote_tech = self._csr(vote_rows, n_rows)
+        self.veto_ptr, self.veto_tech = self._csr(veto_rows, n_rows)
+
+        self.params: list[str] = [""] * n_rows
+        for q, answers in lookup.items():
+            for a, entry in answers.items():
+                self.params[self.row_of[q][a]] = entry["params"]
+
+        self._views()
+
+    @staticmethod
+    def _csr(rows: dict[int, list[int]], n_rows: int):
+        sizes = [len(rows.get(r, ())) for r in range(n_rows)]
+        ptr = np.zeros(n_rows + 1, dtype=np.int32)
+        np.cumsum(sizes, out=ptr[1:])
+        ids = np.fromiter((t for r in range(n_rows) for t in rows.get(r, ())),
+                          dtype=np.int32, count=int(ptr[-1]))
+        return ptr, ids
+
+    def _views(self):
+        # zero-copy views of the CSR buffers whose items index as plain
+        # Python ints, for score()'s per-row loops
+        self._vote_ptr, self._vote_tech = memoryview(self.vote_ptr), memoryview(self.vote_tech)
+        self._veto_ptr, self._veto_tech = memoryview(self.veto_ptr), memoryview(self.veto_tech)
+
+    @staticmethod
+    def _gather(ptr, ids, rows):
+        # ids[ptr[r]:ptr[r + 1]] for every r in rows, concatenated in order,
+        # and for each the index into `rows` it came from
+        idx = np.asarray(rows, dtype=np.intp)
+        lo = ptr[idx].astype(np.intp)
+        sizes = ptr[idx + 1] - lo
+        ends = np.cumsum(sizes)
+        take = np.arange(int(ends[-1]) if len(ends) else 0) + np.repeat(lo - (ends - sizes), sizes)
+        return ids[take], np.repeat(np.arange(len(idx)), sizes)
+
+    def votes_of(self, r: int):
+        return self.vote_tech[self.vote_ptr[r]:self.vote_ptr[r + 1]]
+
+    def vetoes_of(self, r: int):
+        return self.veto_tech[self.veto_ptr[r]:self.veto_ptr[r + 1]]
+
+    def reason(self, r: int) -> str:
+        # how a deal-breaker row is cited in "vetoed"
+        q, a = self.row_key[r]
+        return f"{q} → {a}"
+
+    def veto_summary(self, rows: list[int]) -> list[dict]:
+        # [{name, reasons}] for every technique the rows veto, by technique id
+        reasons: dict[int, list[str]] = {}
+        ptr = self.veto_ptr.tolist()
+        for r in rows:
+            lo, hi = ptr[r], ptr[r + 1]
+            if lo == hi:
                 continue
-            for tech in entry["techs"]:
-                votes[tech] = votes.get(tech, 0) + 1
-            if entry["params"]:
-                params_out.append(entry["params"])
-
-    # 2) Apply any deal-breakers
-    #    Any PET listed under deal_map[q_text][ans] is vetoed
-    for q_text, sel in answers.items():
-        if not deal_col:
-            break
-        sels = sel if isinstance(sel, list) else [sel]
-        for ans in sels:
-            pets_to_veto = deal_map.get(q_text, {}).get(ans, [])
-            for pet in pets_to_veto:
-                vetoed.add(pet)
-
-    # 3) Filter out vetoed PETs entirely
-    for pet in vetoed:
-        votes.pop(pet, None)
-
-    # 4) Build the final ranked list
-    ranked = sorted(votes.items(), key=lambda kv: kv[1], reverse=True)
-    ranked_pets = [
-        {"name": tech, "score": cnt, "rationale": ("VETOED" if tech in vetoed else "Matches survey")}
-        for tech, cnt in ranked
-    ]
+            reason = self.reason(r)
+            for t in self.veto_tech[lo:hi].tolist():
+                reasons.setdefault(t, []).append(reason)
+        return [{"name": self.techniques[t], "reasons": reasons[t]} for t in sorted(reasons)]
+
+    def as_dicts(self) -> tuple[dict, dict]:
+        # the nested { question -> { answer -> … } } tables this was built from
+        lookup, deal_map = {}, {}
+        for r, (q, a) in enumerate(self.row_key):
+            techs = self.vote_tech[self.vote_ptr[r]:self.vote_ptr[r + 1]].tolist()
+            lookup.setdefault(q, {})[a] = {"techs": [self.techniques[t] for t in techs],
+                                           "params": self.params[r]}
+            pets = self.vetoes_of(r).tolist()
+            if pets:
+                deal_map.setdefault(q, {})[a] = [self.techniques[t] for t in pets]
+        return lookup, deal_map
+
+    def rows(self, answers: dict) -> list[int]:
+        # flatten {question_text: answer(s)} to matched row ids, in order
+        out = []
+        for q_text, sel in answers.items():
+            row_of = self.row_of.get(q_text)
+            if row_of is None:
+                continue
+            for ans in (sel if isinstance(sel, list) else [sel]):
+                r = row_of.get(ans)
+                if r is not None:
+                    out.append(r)
+        return out
+
+    def score(self, rows: list[int]):
+        if not rows:
+            return [], [], []
+
+        # One survey is a few dozen rows of a few techniques each: plain
+        # int loops beat numpy's per-call overhead here (score_batch() is
+        # the vectorized path). `counts` keeps first-mention order and the
+        # sort is stable, so ties stay "first voted, first listed".
+        ptr, techs = self._vote_ptr, self._vote_tech
+        counts = {}
+        for r in rows:
+            for t in techs[ptr[r]:ptr[r + 1]]:
+                counts[t] = counts.get(t, 0) + 1
+        ptr, techs = self._veto_ptr, self._veto_tech
+        vetoed = {t for r in rows for t in techs[ptr[r]:ptr[r + 1]]}
+        order = sorted((t for t in counts if t not in vetoed), key=lambda t: -counts[t])
+        ranked_pets = [
+            {"name": self.techniques[t], "score": counts[t], "rationale": "Matches survey"}
+            for t in order
+        ]
 
-    # 5) Deduplicate parameter suggestions
-    param_suggestions = sorted(set(params_out))
+        param_suggestions = sorted({self.params[r] for r in rows if self.params[r]})
+
+        veto_summary = self.veto_summary(rows) if vetoed else []
+
+        return ranked_pets, param_suggestions, veto_summary
+
+    def score_batch(self, batch: list[list[int]]):
+        # Same result as [score(rows) for rows in batch], vectorized over the
+        # lot: every survey's votes are gathered out of the CSR buffers and
+        # counted per (survey, technique) with one bincount / unique.
+        n, n_techs = len(batch), len(self.techniques)
+        results = [([], [], []) for _ in range(n)]
+        sizes = np.fromiter((len(rows) for rows in batch), dtype=np.intp, count=n)
+        if not sizes.any():
+            return results
+
+        flat = np.fromiter((r for rows in batch for r in rows), dtype=np.intp, count=int(sizes.sum()))
+        owner = np.repeat(np.arange(n), sizes)
+
+        techs, at = self._gather(self.vote_ptr, self.vote_tech, flat)
+        # (survey, technique) keys in survey order: the first index of each
+        # is that technique's first mention, the tie-break within a survey
+        keys, first, counts = np.unique(owner[at] * n_techs + techs,
+                                        return_index=True, return_counts=True)
+        vetoes, at = self._gather(self.veto_ptr, self.veto_tech, flat)
+        vetoed = np.zeros(n * n_techs, dtype=bool)
+        vetoed[owner[at] * n_techs + vetoes] = True
+
+        # rank every live (survey, technique) pair with a single sort
+        live = ~vetoed[keys]
+        keys, first, counts = keys[live], first[live], counts[live]
+        order = np.lexsort((first, -counts, keys // n_techs))
+        for key, c in zip(keys[order].tolist(), counts[order].tolist()):
+            s, t = divmod(key, n_techs)
+            results[s][0].append({"name": self.techniques[t], "score": c, "rationale": "Matches survey"})
+
+        has_veto = np.zeros(n, dtype=bool)
+        has_veto[owner[at]] = True
+        for s in np.flatnonzero(sizes).tolist():
+            rows = batch[s]
+            results[s][1].extend(sorted({self.params[r] for r in rows if self.params[r]}))
+            if has_veto[s]:
+                results[s][2].extend(self.veto_summary(rows))
+        return results
+
+    # -- sharing with worker processes ---------------------------------------
+
+    def export_tables(self, path: Path) -> dict:
+        # Write the matrices back to back into one flat file and return a
+        # small picklable spec; workers memory-map that file read-only
+        # instead of each building (or copying) its own tables.
+        layout, offset = {}, 0
+        with open(path, "wb") as fh:
+            for name in self.MATRICES:
+                arr = np.ascontiguousarray(getattr(self, name))
+                fh.write(arr.tobytes())
+                layout[name] = (offset, arr.shape, arr.dtype.str)
+                offset += arr.nbytes
+        return {
+            "path":         str(path),
+            "layout":       layout,
+            "techniques":   self.techniques,
+            "row_key":      self.row_key,
+            "params":       self.params,
+        }
 
-    # 6) Prepare a summary of which PETs were vetoed and why
-    veto_summary = []
-    for pet in vetoed:
-        # find all (q,ans) that vetoed this pet
-        reasons = []
-        for q_text, sel in answers.items():
-            sels = sel if isinstance(sel, list) else [sel]
-            for ans in sels:
-                if pet in deal_map.get(q_text, {}).get(ans, []):
-                    reasons.append(f"{q_text} → {ans}")
-        veto_summary.append({"name": pet, "reasons": reasons})
+    @classmethod
+    def attach_tables(cls, spec: dict) -> "ScoringEngine":
+        engine = cls.__new__(cls)
+        engine.techniques = spec["techniques"]
+        engine.technique_id = {t: i for i, t in enumerate(engine.techniques)}
+        engine.row_key = spec["row_key"]
+        engine.row_of = {}
+        for r, (q, a) in enumerate(engine.row_key):
+            engine.row_of.setdefault(q, {})[a] = r
+        engine.params = spec["params"]
+        for name, (offset, shape, dtype) in spec["layout"].items():
+            if not all(shape):      # np.memmap refuses zero-length maps
+                setattr(engine, name, np.zeros(shape, dtype=dtype))
+                continue
+            setattr(engine, name, np.memmap(spec["path"], dtype=dtype, mode="r",
+                                            offset=offset, shape=tuple(shape)))
+        engine._views()
+        return engine
 
-    return ranked_pets, param_suggestions, veto_summary
 
+# -----------------------------------------------------------------------------
+# Survey payload validation (raw JSON → canonical sorted answer rows)
+# -----------------------------------------------------------------------------
+class PayloadError(ValueError):
+    def __init__(self, problems: list[str], status: int = 400):
+        super().__init__("; ".join(problems))
+        self.problems = problems
+        self.status = status
+
+
+class SurveyValidator:
+    # Compiled once per rule set: each accepted key (question id or text)
+    # maps straight to its question and an {answer option -> row} table,
+    # so a payload is checked and canonicalized in one pass over its own
+    # keys, and gives up after MAX_PROBLEMS.
+
+    MAX_PROBLEMS = 10
+    NO_ROW = -1                 # a listed option with no rule behind it
+
+    def __init__(self, catalog: QuestionCatalog, engine: ScoringEngine):
+        self.max_keys = len(catalog.questions)
+        self.row_key = engine.row_key
+        self.fields: dict[str, tuple[str, bool, dict[str, int]]] = {}
+        for q in catalog.questions:
+            known = engine.row_of.get(q.text, {})
+            rows = {str(o): known.get(str(o).strip(), self.NO_ROW) for o in q.options}
+            rows.update(known)
+            self.fields[q.id] = self.fields[q.text] = (q.text, q.multi, rows)
+
+    def parse(self, raw, allow_clear: bool = False) -> tuple[dict, list[int]]:
+        # → ({question text: answer(s)}, sorted answer rows). Unanswered
+        # questions (null or []) are dropped, or kept as None when
+        # `allow_clear` (a what-if delta clearing them).
+        if not isinstance(raw, dict):
+            raise PayloadError(["expected an object of answers"])
+        if len(raw) > self.max_keys:
+            raise PayloadError([f"at most {self.max_keys} answers"])
+
+        answers, rows, problems = {}, [], []
+        for key, value in raw.items():
+            field = self.fields.get(key)
+            if field is None:
+                problems.append(f"unknown question {key[:80]!r}")
+            elif field[0] in answers:
+                problems.append(f"{key[:80]!r} answered twice")
+            elif value is None or value == []:
+                if allow_clear:
+                    answers[field[0]] = None
+            elif isinstance(value, str) or (field[1] and isinstance(value, list)
+                                            and len(value) <= len(field[2])):
+                text, multi, row_of = field
+                picked = value if isinstance(value, list) else [value]
+                hits = [row_of.get(v) if isinstance(v, str) else None for v in picked]
+                if None in hits:
+                    bad = picked[hits.index(None)]
+                    problems.append(f"{key[:80]!r}: unknown answer {str(bad)[:80]!r}")
+                elif len(set(picked)) != len(picked):
+                    problems.append(f"{key[:80]!r}: repeated answer")
+                else:
+                    # options as the rules spell them (the sheet's raw
+                    # option text can carry stray whitespace)
+                    canon = [v if r == self.NO_ROW else self.row_key[r][1]
+                             for v, r in zip(picked, hits)]
+                    answers[text] = canon if isinstance(value, list) else canon[0]
+                    rows.extend(r for r in hits if r != self.NO_ROW)
+            else:
+                problems.append(f"{key[:80]!r}: expected "
+                                f"{'a list of options' if field[1] else 'one option'}")
+            if len(problems) >= self.MAX_PROBLEMS:
+                break
+        if problems:
+            raise PayloadError(problems)
+        rows.sort()
+        return answers, rows
 
 
 # -----------------------------------------------------------------------------
-# Implementation-wizard sub-questions
+# Active rule set, swapped atomically on hot reload
 # -----------------------------------------------------------------------------
-def dp_steps():
-    return [
-        {
-            "id": "D1",
-            "text": "1) Maximum absolute error you can tolerate (Δ=1):",
-            "input_type": "number",
-            "placeholder": "e.g. 2.0"
-        },
-        {
-            "id": "D2",
-            "text": "2) Expected number of queries per day:",
-            "input_type": "number",
-            "placeholder": "e.g. 50"
-        }
+@dataclass(frozen=True)
+class RuleSet:
+    version:   str                      # short sha256 of the source sheet
+    digest:    str                      # full sha256
+    deal_col:  str | None
+    param_col: str | None
+    routing:   dict                     # { technique -> {category, wizard} }
+    catalog:   QuestionCatalog
+    engine:    ScoringEngine
+    validator: SurveyValidator
+    precomputed: Mapping = field(default_factory=dict)     # answers_digest → result
+
+
+def ruleset_from_snapshot(snapshot: dict, precomputed: Path = PRECOMPUTED_FILE) -> RuleSet:
+    rules = snapshot["rules"]
+    with stage("catalog"):
+        catalog = compile_catalog(rules["questions"])       # ~ build_questions()
+    with stage("engine"):
+        engine = ScoringEngine(rules["lookup"], rules["deal_map"])
+    with stage("precomputed"):
+        table = load_precomputed(snapshot["source"][:12], precomputed)
+    return RuleSet(
+        version=snapshot["source"][:12],
+        digest=snapshot["source"],
+        deal_col=rules["deal_col"],
+        param_col=rules["param_col"],
+        routing=rules["routing"],
+        catalog=catalog,
+        engine=engine,
+        validator=SurveyValidator(catalog, engine),
+        precomputed=table,
+    )
+
+
+def load_precomputed(version: str, path: Path = PRECOMPUTED_FILE) -> Mapping:
+    try:
+        with open(path, "rb") as fh:
+            table = pickle.load(fh)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return {}
+    if table.get("format") != PRECOMPUTED_FORMAT or table.get("rules") != version:
+        return {}
+    return MappingProxyType(table["entries"])
+
+
+with stage("load_rules"):
+    RULES = ruleset_from_snapshot(load_snapshot())
+
+
+def active_rules() -> RuleSet:
+    # A request keeps the version it started with (bound in before_request);
+    # everything else sees the newest one.
+    if has_request_context():
+        return g.get("rules") or RULES
+    return RULES
+
+
+def swap_rules(new: RuleSet):
+    global RULES
+    RULES = new     # a single reference store: readers see old or new, never half
+
+
+class RulesWatcher(threading.Thread):
+    # Polls the spreadsheet (and its snapshot) by mtime/size and rebuilds the
+    # rule set on this background thread, off the request path.
+
+    def __init__(self, interval: float, source: Path = DATA_FILE, snapshot: Path = SNAPSHOT_FILE):
+        super().__init__(name="rules-watcher", daemon=True)
+        self.interval = interval
+        self.source = source
+        self.snapshot = snapshot
+        self.pid = os.getpid()
+        self._parsed: dict = {}         # parse_row() memo, see compile_rules()
+        self._seen = None               # first poll checks the digest once
+
+    def _stamp(self):
+        stamp = []
+        for path in (self.source, self.snapshot):
+            try:
+                st = path.stat()
+                stamp.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                stamp.append(None)
+        return stamp
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            stamp = self._stamp()
+            if stamp == self._seen:
+                continue
+            self._seen = stamp
+            try:
+                self.reload()
+            except Exception:
+                # keep serving the old version; the next edit retries
+                app.logger.exception("rule reload from %s failed", self.source)
+
+    def reload(self):
+        if not self.source.exists():
+            return
+        digest = file_digest(self.source)
+        if digest == RULES.digest:
+            return
+        snapshot = read_snapshot(self.snapshot)
+        if (snapshot is None or snapshot["source"] != digest
+                or snapshot["wizards"] != file_digest(WIZARD_FILE)):
+            known = set(self._parsed)
+            with stage("compile_sheet"):
+                snapshot = build_snapshot(self.source, self._parsed)
+            try:
+                write_snapshot(snapshot, self.snapshot)
+            except OSError as exc:
+                app.logger.warning("could not save %s: %s", self.snapshot, exc)
+            app.logger.info("compiled %s: %d of %d rows re-parsed", self.source.name,
+                            len(self._parsed.keys() - known), len(self._parsed))
+        with stage("load_rules"):
+            new = ruleset_from_snapshot(snapshot)
+        old = RULES.version
+        swap_rules(new)
+        app.logger.info("rules reloaded: %s -> %s", old, new.version)
+
+
+RELOAD_INTERVAL = float(os.environ.get("PETS_RELOAD_INTERVAL", 2.0))   # 0 = off
+_watcher: RulesWatcher | None = None
+_watcher_lock = threading.Lock()
+
+
+def ensure_watcher():
+    # Started lazily from the first request so each (forked) worker gets its
+    # own thread, and importing the module for CLI use starts nothing.
+    global _watcher
+    if RELOAD_INTERVAL <= 0 or (_watcher is not None and _watcher.pid == os.getpid()):
+        return
+    with _watcher_lock:
+        if _watcher is None or _watcher.pid != os.getpid():
+            _watcher = RulesWatcher(RELOAD_INTERVAL)
+            _watcher.start()
+
+
+# -----------------------------------------------------------------------------
+# Named rule sets (/<ruleset>/...), loaded lazily, LRU-evicted by size
+# -----------------------------------------------------------------------------
+RULESET_NAME = re.compile(r"[a-z0-9][a-z0-9_-]{0,63}")
+
+
+def ruleset_nbytes(rules: RuleSet, snapshot: dict) -> int:
+    # rough resident size: the engine's buffers, the pickled rule tables as
+    # a stand-in for their Python objects, and the catalog's JSON copies
+    engine = rules.engine
+    return (sum(getattr(engine, name).nbytes for name in engine.MATRICES)
+            + len(pickle.dumps(snapshot["rules"], protocol=pickle.HIGHEST_PROTOCOL))
+            + 2 * len(rules.catalog.json))
+
+
+class RuleSetRegistry:
+    # Rule sets named after the <name>.xlsx / <name>.snapshot files in
+    # `root`. A set is compiled (or unpickled) on its first request, its
+    # files are re-checked at most every `recheck` seconds, and the least
+    # recently used sets are dropped once their total estimated size
+    # passes `budget`. The set being returned is never the one dropped.
+
+    def __init__(self, root: Path | None, budget: int, recheck: float):
+        self.root = root
+        self.budget = budget
+        self.recheck = recheck
+        # name -> (rule set, estimated bytes, file stamp, last checked)
+        self._loaded: OrderedDict[str, tuple[RuleSet, int, list, float]] = OrderedDict()
+        self._names: frozenset = frozenset()
+        self._listed = -math.inf
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    def names(self) -> frozenset:
+        now = time.monotonic()
+        if self.root is not None and now - self._listed >= self.recheck:
+            found = {p.stem for pattern in ("*.xlsx", "*.snapshot") for p in self.root.glob(pattern)}
+            self._names = frozenset(n for n in found if RULESET_NAME.fullmatch(n))
+            self._listed = now
+        return self._names
+
+    def paths(self, name: str) -> tuple[Path, Path, Path]:
+        base = self.root / name
+        return base.with_suffix(".xlsx"), base.with_suffix(".snapshot"), base.with_suffix(".answers")
+
+    def _stamp(self, name: str) -> list:
+        stamp = []
+        for path in self.paths(name):
+            try:
+                st = path.stat()
+                stamp.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                stamp.append(None)
+        return stamp
+
+    def get(self, name: str) -> RuleSet:
+        now = time.monotonic()
+        with self._lock:
+            hit = self._loaded.get(name)
+            if hit is not None:
+                rules, size, stamp, checked = hit
+                if now - checked < self.recheck or self._stamp(name) == stamp:
+                    self._loaded[name] = (rules, size, stamp, checked if now - checked < self.recheck else now)
+                    self._loaded.move_to_end(name)
+                    return rules
+
+        # Compile outside the lock: a slow sheet only delays its own
+        # requests. Two first requests may both load; the later one wins.
+        stamp = self._stamp(name)
+        source, snapshot_path, precomputed = self.paths(name)
+        with stage("load_rules"):
+            snapshot = load_snapshot(source, snapshot_path, persist=source.exists())
+            rules = ruleset_from_snapshot(snapshot, precomputed)
+        size = ruleset_nbytes(rules, snapshot)
+
+        with self._lock:
+            self._loaded[name] = (rules, size, stamp, now)
+            self._loaded.move_to_end(name)
+            self.loads += 1
+            total = sum(entry[1] for entry in self._loaded.values())
+            while total > self.budget and len(self._loaded) > 1:
+                evicted, entry = self._loaded.popitem(last=False)
+                total -= entry[1]
+                self.evictions += 1
+                app.logger.info("rule set %s evicted (%d bytes over budget)", evicted, total)
+        app.logger.info("rule set %s loaded (version %s, ~%d bytes)", name, rules.version, size)
+        return rules
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"loaded": len(self._loaded), "bytes": sum(e[1] for e in self._loaded.values()),
+                    "budget": self.budget, "loads": self.loads, "evictions": self.evictions}
+
+
+RULESETS = RuleSetRegistry(RULESET_DIR, RULESET_BUDGET, max(RELOAD_INTERVAL, 1.0))
+
+
+def evaluate(answers: dict):
+    # raises PayloadError exactly as POST /api/evaluate would
+    rules = active_rules()
+    return rules.engine.score(rules.validator.parse(answers)[1])
+
+
+def evaluate_batch(answer_sets: list[dict]):
+    rules = active_rules()
+    return rules.engine.score_batch([rules.validator.parse(a)[1] for a in answer_sets])
+
+
+# -----------------------------------------------------------------------------
+# Memoized evaluation (content-addressed by the canonical answer set)
+# -----------------------------------------------------------------------------
+class EvaluationCache:
+    # Bounded LRU of evaluate() results, keyed by (rules version, answers
+    # digest): row ids are only meaningful within one version, and several
+    # versions (named rule sets, or old and new around a reload) share it.
+
+    def __init__(self, max_items: int = 4096):
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict[tuple[str, bytes], tuple] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, version: str, key: bytes, compute):
+        key = (version, key)
+        with self._lock:
+            hit = self._items.get(key)
+            if hit is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return hit
+            self.misses += 1
+
+        value = compute()
+        with self._lock:
+            self._items[key] = value
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._items),
+                    "max_items": self.max_items}
+
+
+EVAL_CACHE = EvaluationCache(int(os.environ.get("PETS_EVAL_CACHE_SIZE", 4096)))
+
+
+def answers_digest(rows: list[int]) -> bytes:
+    return hashlib.blake2b(array("l", rows).tobytes(), digest_size=16).digest()
+
+
+def evaluate_rows(rows: list[int]):
+    # `rows` is the canonical sorted form (see SurveyValidator.parse())
+    rules = active_rules()
+    with stage("evaluate"):
+        digest = answers_digest(rows)
+        hit = rules.precomputed.get(digest)
+        if hit is not None:
+            return hit
+        return EVAL_CACHE.get_or_compute(
+            rules.version, digest, lambda: rules.engine.score(rows)
+        )
+
+
+# -----------------------------------------------------------------------------
+# Planning calculators (DP budget, MPC threshold) over whole parameter grids
+# -----------------------------------------------------------------------------
+GRID_MAX_CELLS = 1_000_000      # `python cli.py calc`
+# POST /api/calculators/* is unauthenticated: keep a request's CPU, memory
+# and response size small, and smaller again for one JSON object per cell
+API_GRID_MAX_CELLS = int(os.environ.get("PETS_API_GRID_CELLS", 50_000))
+API_TABLE_MAX_CELLS = int(os.environ.get("PETS_API_TABLE_CELLS", 10_000))
+MPC_MODELS = ("semi-honest", "malicious", "invalid")     # mpc_grid() codes
+
+
+def dp_grid(error, queries) -> dict:
+    # error tolerance (Δ=1) × queries/day → ε per query = 1/error (0 when
+    # error ≤ 0) and ε per day = ε per query × queries
+    error = np.atleast_1d(np.asarray(error, dtype=np.float64))
+    queries = np.atleast_1d(np.asarray(queries, dtype=np.float64))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        eps_q = np.where(error > 0, 1.0 / error, 0.0)
+    return {"epsilon_per_query": eps_q, "epsilon_per_day": np.multiply.outer(eps_q, queries)}
+
+
+def mpc_grid(parties, corruptions) -> dict:
+    # parties n × tolerated corruptions t → index into MPC_MODELS:
+    # semi-honest (BGW/GMW) if t < n/2, malicious (SPDZ) if t < n
+    n = np.atleast_1d(np.asarray(parties, dtype=np.int64))
+    t = np.atleast_1d(np.asarray(corruptions, dtype=np.int64))
+    nn, tt = np.meshgrid(n, t, indexing="ij", sparse=True)
+    return {
+        "model": np.select([2 * tt < nn, tt < nn], [0, 1], 2),
+        "max_corruptions": {"semi-honest": (n - 1) // 2, "malicious": n - 1},
+    }
+
+
+def grid_axis(name: str, spec, integer: bool, limit: int = GRID_MAX_CELLS) -> np.ndarray:
+    # [v, …], or {"start", "stop", "num"} (evenly spaced, inclusive), or
+    # {"start", "stop", "step"} (inclusive of stop when it lands on it).
+    # Ranges are sized before anything is allocated.
+    try:
+        if isinstance(spec, dict):
+            start, stop = float(spec["start"]), float(spec["stop"])
+            if not (math.isfinite(start) and math.isfinite(stop)):
+                raise ValueError(spec)
+            if "num" in spec:
+                step, count = None, int(spec["num"])
+            else:
+                step = float(spec.get("step", 1))
+                # len(np.arange(start, stop + step / 2, step))
+                count = math.ceil((stop - start + step / 2) / step) if step > 0 else None
+        elif isinstance(spec, list):
+            values = np.asarray(spec, dtype=np.float64)
+        else:
+            values = np.asarray([spec], dtype=np.float64)
+    except (KeyError, TypeError, ValueError, OverflowError):
+        raise PayloadError([f"{name}: expected a list of numbers or {{start, stop, num|step}}"])
+    if isinstance(spec, dict):
+        if count is None:
+            raise PayloadError([f"{name}: step must be greater than 0"])
+        if count > limit:
+            raise PayloadError([f"{name}: at most {limit} values"], 413)
+        if step is None:
+            values = np.linspace(start, stop, max(count, 0))
+        else:
+            values = np.arange(start, stop + step / 2, step)
+    if values.ndim != 1 or not values.size or not np.isfinite(values).all():
+        raise PayloadError([f"{name}: expected at least one finite number"])
+    if values.size > limit:
+        raise PayloadError([f"{name}: at most {limit} values"], 413)
+    if integer:
+        if (values != np.round(values)).any() or (np.abs(values) > 2**53).any():
+            raise PayloadError([f"{name}: expected integers"])
+        values = values.astype(np.int64)
+    return values
+
+
+def check_grid_size(*axes, limit: int = GRID_MAX_CELLS):
+    cells = math.prod(len(a) for a in axes)
+    if cells > limit:
+        raise PayloadError([f"grid has {cells} cells; at most {limit}"], 413)
+
+
+def grid_table(axes: dict[str, np.ndarray], values: dict[str, np.ndarray]) -> list[dict]:
+    # long format: one row per grid cell, axes varying last-fastest
+    mesh = np.meshgrid(*axes.values(), indexing="ij")
+    columns = {name: m.ravel().tolist() for name, m in zip(axes, mesh)}
+    shape = mesh[0].shape
+    columns.update((name, np.broadcast_to(v, shape).ravel().tolist()) for name, v in values.items())
+    return [dict(zip(columns, row)) for row in zip(*columns.values())]
+
+
+def grid_json(axes: dict[str, np.ndarray], values: dict[str, np.ndarray]) -> dict:
+    # axes + one array per value over all of them, heatmap-ready
+    shape = tuple(len(a) for a in axes.values())
+    return {
+        "dims":   list(axes),           # axis order of every values array
+        "axes":   {name: a.tolist() for name, a in axes.items()},
+        "values": {name: np.broadcast_to(v, shape).tolist() for name, v in values.items()},
+    }
+
+
+def dp_calculator(error, queries, limit: int = GRID_MAX_CELLS) -> tuple[dict, dict]:
+    check_grid_size(error, queries, limit=limit)
+    result = dp_grid(error, queries)
+    return {"error": error, "queries": queries}, {
+        "epsilon_per_query": result["epsilon_per_query"][:, None],
+        "epsilon_per_day":   result["epsilon_per_day"],
+    }
+
+
+def mpc_calculator(parties, corruptions, limit: int = GRID_MAX_CELLS) -> tuple[dict, dict]:
+    check_grid_size(parties, corruptions, limit=limit)
+    result = mpc_grid(parties, corruptions)
+    limits = result["max_corruptions"]
+    return {"parties": parties, "corruptions": corruptions}, {
+        "model":                       np.asarray(MPC_MODELS)[result["model"]],
+        "max_corruptions_semi_honest": limits["semi-honest"][:, None],
+        "max_corruptions_malicious":   limits["malicious"][:, None],
+    }
+
+
+# -----------------------------------------------------------------------------
+# Implementation wizards (declared in wizards.json, compiled once)
+# -----------------------------------------------------------------------------
+# Each tool in wizards.json has
+#   "match":   lowercase substrings that route a technique name to it
+#   "steps":   the questions wizard.html asks
+#   "lines":   declarative output: plain strings ("{D1}" inserts an answer),
+#              {"echo": [[step, label], …]} and
+#              {"step": id, "cases": [[[substr, …], line], …], "default": line,
+#               "ignore_case": bool, "all": bool}   (first match unless "all")
+#   "handler": optional name in WIZARD_HANDLERS for computed output, called
+#              with (answers, "params") and appended after "lines"
+WIZARD_HANDLERS: dict[str, Callable[[dict, dict], list[str]]] = {}
+
+
+def wizard_handler(name: str):
+    def register(fn):
+        WIZARD_HANDLERS[name] = fn
+        return fn
+    return register
+
+
+@wizard_handler("dp_budget")
+def dp_budget(data: dict, params: dict) -> list[str]:
+    try:
+        err = float(data.get("D1", 0))
+        qpd = int(data.get("D2", 0))
+        result = dp_grid(err, qpd)      # a 1×1 grid
+        eps_q = float(result["epsilon_per_query"][0])
+        eps_tot = float(result["epsilon_per_day"][0, 0])
+        return [f"ε per query ≈ {eps_q:.3f}", f"Total ε/day ≈ {eps_tot:.3f}"]
+    except Exception:
+        return ["⛔ Invalid DP inputs—could not compute ε."]
+
+
+@wizard_handler("mpc_threshold")
+def mpc_threshold(data: dict, params: dict) -> list[str]:
+    try:
+        # Number of parties and maximum corruptions
+        n = int(data.get("S1", 0))
+        t = int(data.get("S2", 0))
+        model = MPC_MODELS[mpc_grid(n, t)["model"][0, 0]]       # a 1×1 grid
+    except (TypeError, ValueError, OverflowError):
+        n, t = None, None
+
+    config = ["Your MPC configuration:"]
+    if n is None or t is None:
+        config.append("  ⛔ Invalid inputs—please enter integers for parties and threshold.")
+    else:
+        config.append(f"  • Total parties (n): {n}")
+        config.append(f"  • Max corruptions tolerated (t): {t}")
+        config.append("")
+        config.append("Protocol recommendations:")
+
+        # Choose protocol family by adversary tolerance
+        if model == "semi-honest":
+            config.append("  – Semi-honest model (t < n/2): Consider BGW or GMW (Shamir secret‐sharing).")
+        elif model == "malicious":
+            config.append("  – Malicious model (t < n): Consider SPDZ/MASCOT or HoneyBadgerMPC for stronger security.")
+        else:
+            config.append("  – Warning: t must be < n for security—please adjust your threshold.")
+            config.append("")
+            config.append("Libraries & frameworks:")
+            config.append("  • MP-SPDZ (C++): supports many protocols & security levels.")
+            config.append("  • SCALE-MAMBA (Python/C++): friendly DSL & semi-honest/SPDZ.")
+            config.append("  • VIFF (Python): easy prototyping, semi-honest only.")
+            config.append("  • Sharemind (Rust): commercial‐grade with high‐performance optimizations.")
+
+    config.append("")
+    config.append("Tip: choose your n-of-t threshold based on your trust & threat model.")
+    return config
+
+
+@wizard_handler("k_anonymity")
+def k_anonymity(data: dict, params: dict) -> list[str]:
+    k1 = data.get("K1", "")
+    k2 = data.get("K2", "")
+    # map to k-value
+    k_val = params["k_table"].get(k1, {}).get(k2)
+    l_val = params["l_table"].get(k2, params["l_default"])
+
+    config = [""]
+    if k_val:
+        config.append(f"• Generalize/suppress to achieve k={k_val} and ℓ={l_val}.")
+        config.append("  – k (anonymity): each record is indistinguishable from at least k–1 others sharing the same quasi-identifiers.")
+        config.append("  – ℓ (diversity): each such group must contain at least ℓ distinct sensitive-attribute values.")
+        config.append("  Use a library like ARX (Java) or sdcMicro (R/Python).")
+    else:
+        config.append("• Unable to derive k/ℓ for those choices—please adjust settings.")
+    return config
+
+
+class _Answers(dict):
+    # str.format_map() source: a missing answer renders as ""
+    def __missing__(self, key):
+        return ""
+
+
+def _compile_line(item) -> Callable[[dict, list], None]:
+    # one "lines" entry → fn(answers, out) that appends its output to out
+    if isinstance(item, str):
+        if "{" not in item:
+            return lambda data, out: out.append(item)
+        return lambda data, out: out.append(item.format_map(_Answers(data)))
+
+    if "echo" in item:
+        pairs = [tuple(pair) for pair in item["echo"]]
+
+        def echo(data, out):
+            for step, label in pairs:
+                if step in data:
+                    out.append(f"  • {label}: {data[step]}")
+        return echo
+
+    step, fold = item["step"], item.get("ignore_case", False)
+    cases = [
+        (tuple(kw.lower() if fold else kw for kw in keywords), _compile_line(line))
+        for keywords, line in item["cases"]
     ]
+    default = _compile_line(item["default"]) if "default" in item else None
+    match_all = item.get("all", False)
+
+    def choose(data, out):
+        value = str(data.get(step) or "")
+        if fold:
+            value = value.lower()
+        matched = False
+        for keywords, emit in cases:
+            if any(kw in value for kw in keywords):
+                emit(data, out)
+                matched = True
+                if not match_all:
+                    break
+        if not matched and default:
+            default(data, out)
+    return choose
+
+
+@dataclass(frozen=True)
+class Wizard:
+    name:    str
+    steps:   tuple
+    emit:    tuple          # compiled "lines"
+    handler: Callable | None
+    params:  dict
+
+    def run(self, data: dict) -> list[str]:
+        config = []
+        for emit in self.emit:
+            emit(data, config)
+        if self.handler:
+            config.extend(self.handler(data, self.params))
+        return config
+
+
+def compile_wizards(spec: dict) -> dict[str, Wizard]:
+    wizards = {}
+    for name, tool in spec.items():
+        handler = tool.get("handler")
+        if handler is not None and handler not in WIZARD_HANDLERS:
+            raise ValueError(f"wizard {name!r}: unknown handler {handler!r}")
+        wizards[name] = Wizard(
+            name=name,
+            steps=tuple(MappingProxyType(step) for step in tool["steps"]),
+            emit=tuple(_compile_line(item) for item in tool.get("lines", ())),
+            handler=WIZARD_HANDLERS.get(handler),
+            params=tool.get("params", {}),
+        )
+    return wizards
+
+
+with stage("wizards"):
+    WIZARDS = compile_wizards(WIZARD_SPEC)
+
+WIZARD_UNAVAILABLE = ("This tool is hard to give advice on implementation simply in a wizard. "
+                      "Please consider gain advice from a data privacy expert.")
+
+
+def route_tool(name: str) -> dict:
+    # precompiled for every technique in the sheet; anything else (e.g. a
+    # hand-edited ?tool= query) is classified on the fly
+    hit = active_rules().routing.get(name)
+    return hit if hit is not None else classify_tool(name)
+
+
+def match_wizard(tool: str):
+    # → (display name, step questions), or None if the tool has no wizard
+    wizard = route_tool(tool)["wizard"]
+    if wizard is None:
+        return None
+    return wizard, [dict(step) for step in WIZARDS[wizard].steps]
+
+
+def wizard_config(tool: str, data: dict) -> list[str]:
+    # the recommendation lines for one submitted wizard (tool = display name)
+    wizard = WIZARDS.get(tool)
+    if wizard is None:
+        return [f"No wizard logic found for tool: {tool}"]
+    return wizard.run(data)
+
+
+def split_policies(ranked: list[dict]):
+    # → (privacy techniques, policy recommendations), each in ranked order
+    techniques, policies = [], []
+    for item in ranked:
+        if route_tool(item.get("name", ""))["category"] == "policy":
+            policies.append(item)
+        else:
+            techniques.append(item)
+    return techniques, policies
 
-def mpc_steps():
-    return [
-            {
-                "id": "S1",
-                "text": "1) How many parties are involved?",
-                "input_type": "number",
-                "placeholder": "e.g. 3"
-            },
-            {
-                "id": "S2",
-                "text": "2) How many parties do you think might collude or be taken over by an attacker?",
-                "input_type": "number",
-                "placeholder": "e.g. 1"
+
+# -----------------------------------------------------------------------------
+# Server-side result store (the cookie only carries a short token)
+# -----------------------------------------------------------------------------
+class ResultStore(abc.ABC):
+    # Maps an opaque token to a JSON-able dict. Backends must be safe to
+    # call from several request threads at once.
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+
+    @staticmethod
+    def new_token() -> str:
+        return secrets.token_urlsafe(16)
+
+    @abc.abstractmethod
+    def get(self, token: str):
+        ...
+
+    @abc.abstractmethod
+    def set(self, token: str, value: dict):
+        ...
+
+    @abc.abstractmethod
+    def delete(self, token: str):
+        ...
+
+
+class MemoryResultStore(ResultStore):
+    # In-process LRU with TTL. Only for a single worker process (or the dev
+    # server): a result saved by one worker is invisible to the others.
+
+    def __init__(self, ttl: float, max_items: int = 10_000):
+        super().__init__(ttl)
+        self.max_items = max_items
+        self._items: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        now = time.monotonic()
+        with self._lock:
+            hit = self._items.get(token)
+            if hit is None:
+                return None
+            if hit[0] <= now:
+                del self._items[token]
+                return None
+            self._items.move_to_end(token)
+            return hit[1]
+
+    def set(self, token, value):
+        with self._lock:
+            self._items[token] = (time.monotonic() + self.ttl, value)
+            self._items.move_to_end(token)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def delete(self, token):
+        with self._lock:
+            self._items.pop(token, None)
+
+
+class SQLiteResultStore(ResultStore):
+    # Shared by every worker on the host; one connection per thread (and
+    # per process, so a connection never crosses a pre-fork). The database
+    # is only created on first use, so importing the app never writes it.
+
+    PURGE_EVERY = 500       # writes between sweeps of expired rows
+
+    def __init__(self, ttl: float, path: str):
+        super().__init__(ttl)
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        pid, db = getattr(self._local, "db", (None, None))
+        if pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=10)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            with db:
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS results ("
+                    " token TEXT PRIMARY KEY, expires REAL NOT NULL, data TEXT NOT NULL)"
+                )
+            self._local.db = (os.getpid(), db)
+        return db
+
+    def get(self, token):
+        row = self._conn().execute(
+            "SELECT data FROM results WHERE token = ? AND expires > ?", (token, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, token, value):
+        with self._conn() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO results (token, expires, data) VALUES (?, ?, ?)",
+                (token, time.time() + self.ttl, json.dumps(value, ensure_ascii=False)),
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                db.execute("DELETE FROM results WHERE expires <= ?", (time.time(),))
+
+    def delete(self, token):
+        with self._conn() as db:
+            db.execute("DELETE FROM results WHERE token = ?", (token,))
+
+
+def make_result_store(url: str, ttl: float) -> ResultStore:
+    # "sqlite:/path/to/results.db" (default), or "memory" for one process
+    if url.startswith("sqlite:"):
+        return SQLiteResultStore(ttl, url[len("sqlite:"):])
+    if url == "memory":
+        return MemoryResultStore(ttl)
+    raise ValueError(f"unknown result store: {url!r}")
+
+
+RESULT_STORE = make_result_store(
+    os.environ.get("PETS_RESULT_STORE", "sqlite:" + str(Path(__file__).parent / "results.db")),
+    float(os.environ.get("PETS_RESULT_TTL", 24 * 3600)),
+)
+
+
+# -----------------------------------------------------------------------------
+# Submission log (append-only record of every POST /results)
+# -----------------------------------------------------------------------------
+def open_submission_db(path: str) -> sqlite3.Connection:
+    db = sqlite3.connect(path, timeout=10)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=FULL")      # each batch commit is durable
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS submissions ("
+        " id INTEGER PRIMARY KEY, ts REAL NOT NULL, rules TEXT NOT NULL,"
+        " answers TEXT NOT NULL, ranked TEXT NOT NULL, params TEXT NOT NULL,"
+        " vetoed TEXT NOT NULL)"
+    )
+    return db
+
+
+class SubmissionLog(threading.Thread):
+    # Request threads only enqueue; this thread appends to the database in
+    # batches, one transaction (so one fsync) per batch. A full queue drops
+    # the record instead of stalling the request.
+
+    BATCH_MAX = 500
+    FLUSH_INTERVAL = 0.5        # seconds a record may wait for company
+
+    def __init__(self, path: str, queue_size: int = 10_000):
+        super().__init__(name="submission-log", daemon=True)
+        self.path = path
+        self.pid = os.getpid()
+        self.queue: queue.Queue = queue.Queue(queue_size)
+        self.written = 0
+        self.dropped = 0
+
+    def append(self, ts: float, rules: str, answers: dict, ranked, params, vetoed):
+        try:
+            self.queue.put_nowait((ts, rules, answers, ranked, params, vetoed))
+        except queue.Full:
+            self.dropped += 1
+
+    def run(self):
+        db = open_submission_db(self.path)
+        stop = False
+        while not stop:
+            batch = []
+            item = self.queue.get()
+            deadline = time.monotonic() + self.FLUSH_INTERVAL
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= self.BATCH_MAX:
+                    break
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            else:
+                stop = True         # close() sentinel
+            if batch:
+                self._write(db, batch)
+        db.close()
+
+    def _write(self, db: sqlite3.Connection, batch: list):
+        dumps = functools.partial(json.dumps, ensure_ascii=False)
+        try:
+            with db:
+                db.executemany(
+                    "INSERT INTO submissions (ts, rules, answers, ranked, params, vetoed)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    [(ts, rules, dumps(answers), dumps(ranked), dumps(params), dumps(vetoed))
+                     for ts, rules, answers, ranked, params, vetoed in batch],
+                )
+            self.written += len(batch)
+        except sqlite3.Error:
+            self.dropped += len(batch)
+            app.logger.exception("could not append %d submissions to %s", len(batch), self.path)
+
+    def close(self, timeout: float = 5.0):
+        # flush whatever is queued; called at interpreter exit
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self.join(timeout)
+
+
+_submission_log: SubmissionLog | None = None
+_submission_log_lock = threading.Lock()
+
+
+def ensure_submission_log() -> SubmissionLog | None:
+    global _submission_log
+    if not SUBMISSION_LOG:
+        return None
+    if _submission_log is None or _submission_log.pid != os.getpid():
+        with _submission_log_lock:
+            if _submission_log is None or _submission_log.pid != os.getpid():
+                _submission_log = SubmissionLog(SUBMISSION_LOG)
+                _submission_log.start()
+                atexit.register(_submission_log.close)
+    return _submission_log
+
+
+def read_submissions(path: str, since: float = None, rules: str = None):
+    # Streams logged submissions oldest first, as dicts.
+    query, args = "SELECT id, ts, rules, answers, ranked, params, vetoed FROM submissions", []
+    where = []
+    if since is not None:
+        where.append("ts >= ?")
+        args.append(since)
+    if rules:
+        where.append("rules = ?")
+        args.append(rules)
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=10)
+    try:
+        for row_id, ts, version, answers, ranked, params, vetoed in db.execute(query + " ORDER BY id", args):
+            yield {
+                "id": row_id, "ts": ts, "rules": version, "answers": json.loads(answers),
+                "ranked": json.loads(ranked), "params": json.loads(params), "vetoed": json.loads(vetoed),
             }
-        ]
+    finally:
+        db.close()
 
-def sd_steps():
-    return [
-        {"id":"S1",
-         "text":"1) What kind of data are you synthesizing?",
-         "options":["Tabular","Time-series","Graph","Images / Unstructured"]},
-        {"id":"S2",
-         "text":"2) Desired synthetic dataset size:",
-         "options":["Same as real data","Smaller (e.g. 50%)","Larger (e.g. 200%)","Custom…"]},
-
-        {"id":"S4",
-         "text":"4) Do you want Differential Privacy on the synthetic generator?",
-         "options":["Yes (DP-GAN)","No"]},
-        {"id":"S5",
-         "text":"5) How often regenerate synthetic data?",
-         "options":["One-time snapshot","Daily","Weekly","Monthly","Custom…"]},
-        {"id":"S6",
-         "text":"6) Which evaluation criteria matter most?",
-         "options":["Statistical similarity (KS, Chi-square)",
-                  "ML model performance (accuracy, F1)",
-                  "Privacy risk metrics (membership inference, MI)",
-                  "User feedback / qualitative testing"]},
-        {"id":"S7",
-         "text":"7) What are your computational and hardware constraints for generating synthetic data?",
-         "options":[
-           "High-performance GPUs/TPUs in the cloud",
-           "On-premises CPU servers only",
-           "Trusted hardware enclaves (TEE) available",
-           "Very limited compute budget (e.g. single CPU)"
-         ]}
-    ]
 
-def ka_steps():
-    return [
-        {
-            "id": "K1",
-            "text": "1) Approximately how many unique records does your dataset contain?",
-            "options": ["<10k", "10k–100k", "100k–1M", ">1M"]
-        },
-        {
-            "id": "K2",
-            "text": "2) What maximum re-identification risk do you accept?",
-            "options": ["Very low (<1%)", "Low (1–5%)", "Moderate (5–10%)"]
-        }
-    ]
+# -----------------------------------------------------------------------------
+# Response cache for deterministic pages (ETag / 304, gzip at rest)
+# -----------------------------------------------------------------------------
+@dataclass(frozen=True)
+class CachedPage:
+    etag:     str           # strong ETag of the identity body
+    gzipped:  bytes
+    mimetype: str
+
+    def respond(self, req):
+        # Two representations, two strong ETags: "<h>" and "<h>.gz"
+        if req.accept_encodings["gzip"]:
+            resp = app.response_class(self.gzipped, mimetype=self.mimetype)
+            resp.headers["Content-Encoding"] = "gzip"
+            resp.set_etag(self.etag + ".gz")
+        else:
+            resp = app.response_class(gzip.decompress(self.gzipped), mimetype=self.mimetype)
+            resp.set_etag(self.etag)
+        resp.vary.add("Accept-Encoding")
+        resp.cache_control.no_cache = True      # always revalidate; a 304 is cheap
+        return resp.make_conditional(req)
+
+
+class ResponseCache:
+    # LRU of CachedPage, capped by total compressed bytes.
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items: OrderedDict[tuple, CachedPage] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            page = self._items.get(key)
+            if page is not None:
+                self._items.move_to_end(key)
+            return page
+
+    def put(self, key, body: bytes, mimetype: str) -> CachedPage:
+        page = CachedPage(
+            etag=hashlib.blake2b(body, digest_size=16).hexdigest(),
+            gzipped=gzip.compress(body, compresslevel=6, mtime=0),
+            mimetype=mimetype,
+        )
+        if len(page.gzipped) > self.max_bytes:
+            return page                         # too big to keep; still serve it
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= len(old.gzipped)
+            self._items[key] = page
+            self.size += len(page.gzipped)
+            while self.size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted.gzipped)
+        return page
+
+
+PAGE_CACHE = ResponseCache(int(os.environ.get("PETS_PAGE_CACHE_BYTES", 8 * 1024 * 1024)))
+
+
+def cached_page(page_key: Callable[[], object] = tuple):
+    # For GET views whose output depends only on the route, page_key() and
+    # the rules version. page_key() returns just the inputs the view reads,
+    # resolved (never the raw query string), so requests with made-up
+    # parameters share an entry instead of pushing real pages out.
+    # Non-200 responses pass through uncached.
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = (
+                request.script_root,                # /<ruleset> prefix in links
+                request.endpoint,
+                page_key(),
+                active_rules().version,
+                datetime.utcnow().year,             # footer
+            )
+            page = PAGE_CACHE.get(key)
+            if page is None:
+                resp = app.make_response(view(*args, **kwargs))
+                if resp.status_code != 200:
+                    return resp
+                page = PAGE_CACHE.put(key, resp.get_data(), resp.mimetype)
+            return page.respond(request)
+        return wrapper
+    return decorator
+
 
-def te_steps():
-    return [
-        {
-            "id": "T1",
-            "text": "1) Approximately how many unique records will you process?",
-            "options": ["<100k", "100k–1M", ">1M"]
-        },
-        {
-            "id": "T2",
-            "text": "2) Do you have secure hardware enclaves available?",
-            "options": ["Intel SGX / AMD SEV", "AWS Nitro Enclaves", "No"]
-        }
-    ]
 # -----------------------------------------------------------------------------
 # Flask app & routes
 # -----------------------------------------------------------------------------
 app = Flask(__name__)
 app.secret_key = "CHANGE_ME_IN_PROD"
 
+
+class RulesetPrefix:
+    # WSGI middleware: /<ruleset>/rest is routed as /rest with the prefix
+    # moved into SCRIPT_NAME, so every route, and every url_for() link,
+    # works unchanged under it. Names that shadow a route are ignored.
+
+    def __init__(self, wsgi_app, registry: RuleSetRegistry):
+        self.wsgi_app = wsgi_app
+        self.registry = registry
+        self._reserved = None
+
+    def __call__(self, environ, start_response):
+        name, _, rest = environ.get("PATH_INFO", "")[1:].partition("/")
+        if name and name in self.registry.names():
+            if self._reserved is None:
+                self._reserved = {rule.rule.split("/")[1] for rule in app.url_map.iter_rules()}
+            if name not in self._reserved:
+                environ["SCRIPT_NAME"] = environ.get("SCRIPT_NAME", "") + "/" + name
+                environ["PATH_INFO"] = "/" + rest
+                environ["pets.ruleset"] = name
+        return self.wsgi_app(environ, start_response)
+
+
+app.wsgi_app = RulesetPrefix(app.wsgi_app, RULESETS)
+
+BATCH_MAX_SURVEYS = 10_000      # per POST /api/evaluate/batch
+# request body caps: one survey (or what-if delta), and a whole batch
+SURVEY_MAX_BYTES = int(os.environ.get("PETS_SURVEY_MAX_BYTES", 64 * 1024))
+BATCH_MAX_BYTES = int(os.environ.get("PETS_BATCH_MAX_BYTES", 16 * 1024 * 1024))
+app.config["MAX_CONTENT_LENGTH"] = BATCH_MAX_BYTES
+app.config["USE_X_SENDFILE"] = X_SENDFILE
+
+
+def read_json(limit: int = SURVEY_MAX_BYTES):
+    # A declared oversize body is refused before any of it is read. An
+    # undeclared (chunked) one is read to one byte past `limit` (werkzeug
+    # stops there without complaint), so that byte tells us it was too big
+    # rather than letting the truncated body fail as invalid JSON.
+    if request.content_length is not None and request.content_length > limit:
+        raise PayloadError([f"body larger than {limit} bytes"], 413)
+    request.max_content_length = limit + 1
+    try:
+        if len(request.get_data(cache=True)) > limit:
+            raise RequestEntityTooLarge()
+        data = request.get_json(force=True, silent=True)
+    except RequestEntityTooLarge:
+        raise PayloadError([f"body larger than {limit} bytes"], 413)
+    except RecursionError:
+        raise PayloadError(["body is nested too deeply"])
+    if data is None:
+        raise PayloadError(["body is not valid JSON"])
+    return data
+
+
+def read_step_answers() -> dict:
+    # a wizard's answers: {step id: string or number}
+    data = read_json()
+    if not isinstance(data, dict):
+        raise PayloadError(["expected an object of step answers"])
+    bad = [k for k, v in data.items() if v is not None and not isinstance(v, (str, int, float))]
+    if bad:
+        raise PayloadError([f"{k[:80]!r}: expected a string or a number" for k in bad[:10]])
+    return data
+
+
+@app.errorhandler(PayloadError)
+def payload_error(exc: PayloadError):
+    return jsonify({"error": "invalid payload", "problems": exc.problems}), exc.status
+
+
+def result_token_key() -> str:
+    # one stored record per visitor per rule set
+    name = request.environ.get("pets.ruleset")
+    return f"rid:{name}" if name else "rid"
+
+
+def load_user_results() -> dict:
+    token = session.get(result_token_key())
+    with stage("result_store"):
+        return (RESULT_STORE.get(token) if token else None) or {}
+
+
+def save_user_results(**fields):
+    # merge into this visitor's stored record; only the token hits the cookie
+    token = session.get(result_token_key())
+    with stage("result_store"):
+        record = (RESULT_STORE.get(token) if token else None)
+        if record is None:
+            token, record = RESULT_STORE.new_token(), {}
+            session[result_token_key()] = token
+        RESULT_STORE.set(token, {**record, **fields})
+
+
+class TimedSessionInterface(SecureCookieSessionInterface):
+    # cookie session (de)serialization + signing, as the "session" stage
+    def open_session(self, app, request):
+        with stage("session"):
+            return super().open_session(app, request)
+
+    def save_session(self, app, session, response):
+        with stage("session"):
+            return super().save_session(app, session, response)
+
+
+if METRICS_ENABLED:
+    app.session_interface = TimedSessionInterface()
+
+    @app.before_request
+    def start_request_timer():
+        g.request_t0 = time.perf_counter()
+        profiler = ensure_profiler()
+        if profiler:
+            profiler.begin()
+
+    @app.teardown_request
+    def stop_request_timer(exc=None):
+        t0 = g.pop("request_t0", None)
+        if t0 is None:
+            return
+        seconds = time.perf_counter() - t0
+        endpoint = request.endpoint or "unmatched"
+        REQUEST_SECONDS.observe(endpoint, seconds)
+        if _profiler:
+            _profiler.end(f"{request.method} {request.path}", seconds)
+
+    @before_render_template.connect_via(app)
+    def _render_started(sender, template, context, **extra):
+        g.render_t0 = time.perf_counter()
+
+    @template_rendered.connect_via(app)
+    def _render_finished(sender, template, context, **extra):
+        t0 = g.pop("render_t0", None)
+        if t0 is not None:
+            STAGE_SECONDS.observe(f"render:{template.name}", time.perf_counter() - t0)
+
+
+@app.get("/metrics")
+def metrics():
+    if not METRICS_ENABLED:
+        return "metrics are disabled (set PETS_METRICS=1)\n", 404
+    cache = EVAL_CACHE.stats()
+    rulesets = RULESETS.stats()
+    lines = REQUEST_SECONDS.expose() + STAGE_SECONDS.expose() + [
+        "# HELP pets_eval_cache_hits_total Evaluation cache hits.",
+        "# TYPE pets_eval_cache_hits_total counter",
+        f"pets_eval_cache_hits_total {cache['hits']}",
+        "# HELP pets_eval_cache_misses_total Evaluation cache misses.",
+        "# TYPE pets_eval_cache_misses_total counter",
+        f"pets_eval_cache_misses_total {cache['misses']}",
+        "# HELP pets_rules_info Rule set currently being served.",
+        "# TYPE pets_rules_info gauge",
+        f'pets_rules_info{{version="{RULES.version}"}} 1',
+        "# HELP pets_rulesets_loaded Named rule sets currently in memory.",
+        "# TYPE pets_rulesets_loaded gauge",
+        f"pets_rulesets_loaded {rulesets['loaded']}",
+        "# HELP pets_rulesets_bytes Estimated size of the loaded named rule sets.",
+        "# TYPE pets_rulesets_bytes gauge",
+        f"pets_rulesets_bytes {rulesets['bytes']}",
+        "# HELP pets_ruleset_evictions_total Named rule sets dropped for the memory budget.",
+        "# TYPE pets_ruleset_evictions_total counter",
+        f"pets_ruleset_evictions_total {rulesets['evictions']}",
+    ]
+    return app.response_class("\n".join(lines) + "\n",
+                              mimetype="text/plain; version=0.0.4")
+
+
+@app.get("/metrics/profile")
+def metrics_profile():
+    # folded stacks of the slowest requests: flamegraph.pl / speedscope input
+    if not METRICS_ENABLED or _profiler is None:
+        return "profiling is disabled (set PETS_METRICS=1 and PETS_PROFILE_SLOWEST=N)\n", 404
+    return app.response_class(_profiler.folded(), mimetype="text/plain")
+
+
+@app.before_request
+def bind_rules():
+    ensure_watcher()
+    name = request.environ.get("pets.ruleset")
+    g.rules = RULESETS.get(name) if name else RULES
+
+
 @app.context_processor
 def inject_globals():
     return {"current_year": datetime.utcnow().year}
 
 @app.get("/")
+@cached_page()
 def index():
-    # Pass the cleaned questions list into the template
-    return render_template("index.html", questions=build_questions())
+    # The catalog JSON is serialized once at startup, not per request
+    return render_template("index.html", questions_json=active_rules().catalog.html_json)
+
+
+@app.get("/questions.json")
+def questions_json():
+    catalog = active_rules().catalog
+    resp = app.response_class(catalog.json, mimetype="application/json")
+    resp.set_etag(catalog.etag)
+    resp.cache_control.no_cache = True   # always revalidate, 304 is cheap
+    return resp.make_conditional(request)
 
 
 @app.post("/results")
 def results_api():
-    raw = request.get_json(force=True)  # whatever shape it is in
-    # build a mapping id→text so we can translate id-keys back to text
-    questions = build_questions()
-    id_to_text = {q["id"]: q["text"] for q in questions}
-
-    # build the final answers dict: { question_text: answer }
-    answers_by_text = {}
-    for key, val in raw.items():
-        if key in id_to_text:
-            # key was "q1","q2",… → translate
-            answers_by_text[id_to_text[key]] = val
-        else:
-            # assume key already *is* the question text
-            answers_by_text[key] = val
+    answers, rows = active_rules().validator.parse(read_json())
+
+    # identical answer sets hit the cache
+    ranked, params, veto = evaluate_rows(rows)
+
+    save_user_results(ranked=ranked, params=params, vetoed=veto)
+    log = ensure_submission_log()
+    if log:
+        log.append(time.time(), active_rules().version, answers, ranked, params, veto)
 
-    # now evaluate against your lookup
-    ranked, params, veto = evaluate(answers_by_text)
+    return jsonify({"redirect": url_for("show_results")})
 
-    session["ranked"] = ranked
-    session["params"] = params
-    session["vetoed"] = veto
 
-    tools = ",".join(r["name"] for r in ranked)
-    return jsonify({"redirect": url_for("show_results", tools=tools)})
 
+@app.post("/api/evaluate/batch")
+def evaluate_batch_api():
+    # { "surveys": [ {q: answer, …}, … ] } → { "results": [ {ranked, params, vetoed}, … ] }
+    data = read_json(BATCH_MAX_BYTES)
+    surveys = data.get("surveys") if isinstance(data, dict) else data
+    if not isinstance(surveys, list):
+        return jsonify({"error": "expected a list of answer objects under 'surveys'"}), 400
+    if len(surveys) > BATCH_MAX_SURVEYS:
+        return jsonify({"error": f"at most {BATCH_MAX_SURVEYS} surveys per batch"}), 413
+
+    rules = active_rules()
+    batch = []
+    for i, survey in enumerate(surveys):
+        try:
+            batch.append(rules.validator.parse(survey)[1])
+        except PayloadError as exc:
+            raise PayloadError([f"surveys[{i}]: {p}" for p in exc.problems]) from None
+    results = rules.engine.score_batch(batch)
+    return jsonify({"results": [
+        {"ranked": ranked, "params": params, "vetoed": vetoed}
+        for ranked, params, vetoed in results
+    ]})
+
+
+# -----------------------------------------------------------------------------
+# Stateless JSON API (no session, no redirects)
+# -----------------------------------------------------------------------------
+@app.get("/api/questions")
+def api_questions():
+    return questions_json()
+
+
+@app.post("/api/evaluate")
+def api_evaluate():
+    _, rows = active_rules().validator.parse(read_json())
+    ranked, params, vetoed = evaluate_rows(rows)
+    techniques, policies = split_policies(ranked)
+    return jsonify({
+        "version":      active_rules().version,
+        "ranked":       ranked,
+        "techniques":   techniques,
+        "policies":     policies,
+        "params":       params,
+        "vetoed":       vetoed,
+        "wizard_tools": [t["name"] for t in techniques if match_wizard(t["name"])][:3],
+    })
+
+
+# The what-if endpoint is the one stateful API: a base evaluation is kept
+# server-side under a token, together with everything its result is built
+# from, so a delta only touches the rows of the questions it changes:
+#   counts      per-technique vote totals
+#   voters      technique id → sorted rows voting for it (the first one sets
+#               the "first voted, first listed" tie-break)
+#   vetoers     technique id → sorted rows vetoing it (the veto reasons)
+#   param_refs  parameter suggestion → number of rows suggesting it
+# Technique ids are str keys, as they come back from the JSON store.
+def whatif_update(engine: ScoringEngine, state: dict, rows: list[int], sign: int) -> dict:
+    # add (sign=1) or remove (sign=-1) rows; lists are copied before they
+    # change, since the base state may be the store's own object
+    counts = list(state["counts"])
+    voters, vetoers, params = dict(state["voters"]), dict(state["vetoers"]), dict(state["param_refs"])
+
+    def refs(table, r, techs):
+        for t in techs:
+            key = str(t)
+            held = list(table.get(key, ()))
+            if sign > 0:
+                bisect.insort(held, r)
+            else:
+                held.remove(r)
+            if held:
+                table[key] = held
+            else:
+                del table[key]
+
+    for r in rows:
+        techs = engine.votes_of(r).tolist()
+        for t in techs:
+            counts[t] += sign
+        refs(voters, r, dict.fromkeys(techs))
+        refs(vetoers, r, engine.vetoes_of(r).tolist())
+        param = engine.params[r]
+        if param:
+            params[param] = params.get(param, 0) + sign
+            if not params[param]:
+                del params[param]
+    return {**state, "counts": counts, "voters": voters, "vetoers": vetoers, "param_refs": params}
+
+
+def whatif_result(engine: ScoringEngine, state: dict) -> tuple[list, list, list]:
+    # what engine.score() returns for the state's rows, read off the state
+    counts, voters, vetoers = state["counts"], state["voters"], state["vetoers"]
+
+    def first(key):
+        r = voters[key][0]
+        return r, engine.votes_of(r).tolist().index(int(key))
+
+    live = sorted((key for key in voters if key not in vetoers),
+                  key=lambda key: (-counts[int(key)], first(key)))
+    ranked = [{"name": engine.techniques[int(key)], "score": counts[int(key)],
+               "rationale": "Matches survey"} for key in live]
+    vetoed = [{"name": engine.techniques[int(key)], "reasons": [engine.reason(r) for r in vetoers[key]]}
+              for key in sorted(vetoers, key=int)]
+    return ranked, sorted(state["param_refs"]), vetoed
+
+
+def whatif_state(rules: RuleSet, answers: dict) -> dict:
+    engine = rules.engine
+    state = {"rules": rules.version, "answers": answers, "counts": [0] * len(engine.techniques),
+             "voters": {}, "vetoers": {}, "param_refs": {}}
+    state = whatif_update(engine, state, engine.rows(answers), 1)
+    ranked, params, vetoed = whatif_result(engine, state)
+    return {**state, "ranked": ranked, "params": params, "vetoed": vetoed}
+
+
+def apply_whatif(rules: RuleSet, state: dict, changes: dict) -> dict:
+    # Only the rows of changed questions are applied: their old share of
+    # the state is removed and the new one added. A null answer clears
+    # the question.
+    engine = rules.engine
+    answers = dict(state["answers"])
+    removed, added = [], []
+    for q, ans in changes.items():
+        if q in answers:
+            removed += engine.rows({q: answers.pop(q)})
+        if ans is not None and ans != []:
+            answers[q] = ans
+            added += engine.rows({q: ans})
+
+    state = whatif_update(engine, {**state, "answers": answers}, removed, -1)
+    state = whatif_update(engine, state, added, 1)
+    ranked, params, vetoed = whatif_result(engine, state)
+    return {**state, "ranked": ranked, "params": params, "vetoed": vetoed}
+
+
+def ranking_changes(before: list[dict], after: list[dict]) -> list[dict]:
+    old = {p["name"]: {"rank": i, "score": p["score"]} for i, p in enumerate(before, 1)}
+    new = {p["name"]: {"rank": i, "score": p["score"]} for i, p in enumerate(after, 1)}
+    return [
+        {"name": name, "before": old.get(name), "after": new.get(name)}
+        for name in dict.fromkeys([*new, *old])
+        if old.get(name) != new.get(name)
+    ]
+
+
+def veto_changes(before: list[dict], after: list[dict]) -> list[dict]:
+    old = {v["name"]: v["reasons"] for v in before}
+    new = {v["name"]: v["reasons"] for v in after}
+    return [
+        {"name": name, "before": old.get(name), "after": new.get(name)}
+        for name in dict.fromkeys([*new, *old])
+        if old.get(name) != new.get(name)
+    ]
+
+
+@app.post("/api/evaluate/diff")
+def api_evaluate_diff():
+    # {"answers": {…}}                      → new base: full result + token
+    # {"token": t, "changes": {q: answer}}  → only what moved, + a new token
+    data = read_json()
+    if not isinstance(data, dict):
+        return jsonify({"error": "expected an object"}), 400
+    rules = active_rules()
+
+    if "token" not in data:
+        if not isinstance(data.get("answers"), dict):
+            return jsonify({"error": "expected 'answers' (new base) or 'token' + 'changes'"}), 400
+        state = whatif_state(rules, rules.validator.parse(data["answers"])[0])
+        token = RESULT_STORE.new_token()
+        RESULT_STORE.set(token, state)
+        return jsonify({"token": token, "version": rules.version,
+                        **{k: state[k] for k in ("ranked", "params", "vetoed")}})
+
+    if not isinstance(data.get("changes"), dict):
+        return jsonify({"error": "expected 'changes' as an object of answers"}), 400
+    changes, _ = rules.validator.parse(data["changes"], allow_clear=True)
+    base = RESULT_STORE.get(data["token"]) if isinstance(data["token"], str) else None
+    if base is None or "voters" not in base:
+        return jsonify({"error": "unknown or expired token"}), 404
+    if base["rules"] != rules.version:
+        return jsonify({"error": "rules changed since this base was evaluated; start a new base",
+                        "version": rules.version}), 409
+
+    with stage("evaluate"):
+        state = apply_whatif(rules, base, changes)
+    token = RESULT_STORE.new_token()
+    RESULT_STORE.set(token, state)
+    before, after = set(base["params"]), set(state["params"])
+    return jsonify({
+        "token":   token,
+        "base":    data["token"],
+        "version": rules.version,
+        "ranked":  ranking_changes(base["ranked"], state["ranked"]),
+        "vetoed":  veto_changes(base["vetoed"], state["vetoed"]),
+        "params":  {"added": sorted(after - before), "removed": sorted(before - after)},
+    })
+
+
+@app.get("/api/wizard/<path:tool>")
+def api_wizard_steps(tool):
+    found = match_wizard(tool)
+    if found is None:
+        return jsonify({"error": WIZARD_UNAVAILABLE}), 404
+    display, questions = found
+    return jsonify({"tool": display, "questions": questions})
+
+
+@app.post("/api/wizard/<path:tool>")
+def api_wizard_config(tool):
+    found = match_wizard(tool)
+    if found is None:
+        return jsonify({"error": WIZARD_UNAVAILABLE}), 404
+    data = read_step_answers()
+    display, _ = found
+    return jsonify({"tool": display, "config": wizard_config(display, data)})
+
+
+def calculator_limit() -> int:
+    # "grid" (default): axes + one 2-D array per value, heatmap-ready;
+    # "table": one object per cell, so fewer cells
+    return API_TABLE_MAX_CELLS if request.args.get("format") == "table" else API_GRID_MAX_CELLS
+
+
+def calculator_response(axes: dict, values: dict):
+    if request.args.get("format") == "table":
+        return jsonify({"rows": grid_table(axes, values)})
+    return jsonify(grid_json(axes, values))
+
+
+@app.post("/api/calculators/dp")
+def api_calculator_dp():
+    # {"error": [...] | {start, stop, num|step}, "queries": ...}
+    data = read_json()
+    if not isinstance(data, dict):
+        raise PayloadError(["expected an object with 'error' and 'queries'"])
+    limit = calculator_limit()
+    axes, values = dp_calculator(grid_axis("error", data.get("error"), False, limit),
+                                 grid_axis("queries", data.get("queries"), True, limit), limit)
+    return calculator_response(axes, values)
+
+
+@app.post("/api/calculators/mpc")
+def api_calculator_mpc():
+    # {"parties": ..., "corruptions": ...}
+    data = read_json()
+    if not isinstance(data, dict):
+        raise PayloadError(["expected an object with 'parties' and 'corruptions'"])
+    limit = calculator_limit()
+    axes, values = mpc_calculator(grid_axis("parties", data.get("parties"), True, limit),
+                                  grid_axis("corruptions", data.get("corruptions"), True, limit),
+                                  limit)
+    return calculator_response(axes, values)
 
 
 @app.get("/results")
 def show_results():
-    ranked = session.get("ranked", [])
-    params = session.get("params", [])
-    vetoed = session.get("vetoed", [])
-    all_tools = request.args.get("tools", "").split(",")
-    top3_tools = all_tools
-    session["wizard_tools"] = top3_tools[:3]
+    stored = load_user_results()
+    ranked = stored.get("ranked", [])
+    params = stored.get("params", [])
+    vetoed = stored.get("vetoed", [])
 
     # Split ranked into privacy techniques vs policy recommendations
-    recommended_privacy_techniques = []
-    recommended_policies = []
-
-    for item in ranked:
-        name = item.get("name", "").lower()
-        if any(keyword in name for keyword in ["compliance", "policy", "regulation", "ferpa", "hipaa", "gdpr", "foia"]):
-            recommended_policies.append(item)
-        else:
-            recommended_privacy_techniques.append(item)
+    recommended_privacy_techniques, recommended_policies = split_policies(ranked)
 
     # Only take top 2 from each
     top_privacy_techniques = recommended_privacy_techniques[:2]
@@ -325,47 +2366,22 @@ def show_results():
         policies=top_policies,
         parameters=params,
         vetoed=vetoed,
-        wizard_tools=top3_tools
+        wizard_tools=[r["name"] for r in ranked]
     )
 
 
 
 @app.get("/wizard")
+@cached_page(lambda: route_tool(request.args.get("tool", ""))["wizard"])
 def wizard():
-    tool_raw = request.args.get("tool", "").lower().strip()
-
-    # Differential Privacy
-    if "differential privacy" in tool_raw:
-        questions = dp_steps()
-        display   = "Differential Privacy"
-
-    # Secure MPC (catch hyphens, spaces or "mpc")
-    elif any(kw in tool_raw for kw in ("multiparty", "multi-party", "mpc")):
-        questions = mpc_steps()
-        display   = "Secure Multiparty Computation"
-
-    # Synthetic Data
-    elif "synthetic data" in tool_raw:
-        questions = sd_steps()
-        display   = "Synthetic Data Generation"
-
-    # Trusted Execution Environments
-    elif "trusted execution" in tool_raw or "tee" in tool_raw:
-        questions = te_steps()
-        display   = "Trusted Execution Environments"
-
-    # k-anonymity & ℓ-diversity
-    elif "k-anonymity" in tool_raw or "l-diversity" in tool_raw:
-        questions = ka_steps()
-        display   = "k-anonymity & ℓ-diversity"
-
-    else:
+    display = route_tool(request.args.get("tool", ""))["wizard"]
+    if display is None:
         # no match → error
-        return "This tool is hard to give advice on implementation simply in a wizard. Please consider gain advice from a data privacy expert.", 400
-
+        return WIZARD_UNAVAILABLE, 400
+    steps = [dict(step) for step in WIZARDS[display].steps]
     return render_template(
         "wizard.html",
-        steps=[{"tool": display, "questions": questions}],
+        steps=[{"tool": display, "questions": steps}],
         selected_tool=display
     )
 
@@ -375,212 +2391,13 @@ def wizard():
 
 @app.post("/wizard/submit")
 def wizard_submit():
-    data = request.get_json(force=True)
+    data = read_step_answers()
     tool = data.pop("tool", None) or ""
-    session["last_tool"] = tool
-    config = []
-    
-    if tool == "Differential Privacy":
-        # DP logic
-        try:
-            err = float(data.get("D1", 0))
-            qpd = int(data.get("D2", 0))
-            eps_q = 1.0/err if err>0 else 0.0
-            eps_tot = eps_q * qpd
-            config.append(f"ε per query ≈ {eps_q:.3f}")
-            config.append(f"Total ε/day ≈ {eps_tot:.3f}")
-        except Exception:
-            config.append("⛔ Invalid DP inputs—could not compute ε.")
-
-    elif tool == "Synthetic Data Generation":
-        # Start building the config output
-        config.append("Your choices for Synthetic Data Generation:")
-        
-        # Map step IDs to human-readable question labels
-        step_labels = {
-            "S1": "Data type",
-            "S2": "Dataset size",
-            "S3": "Generation method",
-            "S4": "Differential Privacy",
-            "S5": "Regeneration frequency",
-            "S6": "Evaluation criteria",
-            "S7": "Hardware constraints"
-        }
-        # Echo back each answer
-        for step in ["S1","S2","S3","S4","S5","S6","S7"]:
-            if step in data:
-                label = step_labels.get(step, step)
-                config.append(f"  • {label}: {data[step]}")
-        
-        config.append("")  # blank line
-        config.append("Implementation tips and recommendations:")
-
-        # S1 → method category
-        dtype = data.get("S1","").lower()
-        if "tabular" in dtype:
-            config.append("• For tabular data, consider CTGAN or TVAE implementations.")
-        elif "time-series" in dtype:
-            config.append("• For time-series, look at TimeGAN or DP-TS synth frameworks.")
-        elif "graph" in dtype:
-            config.append("• For graph data, explore GraphGAN or PrivGraph.")
-        elif "images" in dtype or "unstructured" in dtype:
-            config.append("• For images/unstructured, try DP-GAN or PATE-GAN variants.")
-        
-        # S2 → relative sizing
-        size = data.get("S2","").lower()
-        if "smaller" in size:
-            config.append("• Smaller samples → faster training; verify distribution overlap.")
-        elif "larger" in size:
-            config.append("• Larger synthetic sets may amplify biases—monitor quality metrics.")
-        elif "custom" in size:
-            config.append("• Custom sizes: balance compute cost vs. data utility.")
-
-        # S3 → specific method
-        method = data.get("S3","").lower()
-        if "gan" in method:
-            config.append("• GAN-based → CTGAN/TVAE for tabular, StyleGAN for images.")
-        elif "bayesian" in method or "copula" in method:
-            config.append("• Bayesian/Copula → SDV’s Bayesian network or CopulaGAN.")
-        elif "vae" in method:
-            config.append("• VAE-based → try DP-VAE or VAE-GAN hybrids.")
-        
-        # S4 → differential privacy toggle
-        dp_on = data.get("S4","").lower()
-        if "yes" in dp_on:
-            config.append("• DP enabled → tune ε carefully; too small harms utility.")
-        else:
-            config.append("• No DP → ensure data leakage risk is acceptable.")
-
-        # S5 → regeneration schedule
-        regen = data.get("S5","").lower()
-        if "daily" in regen:
-            config.append("• Daily regen → automate retraining & quality checks.")
-        elif "weekly" in regen:
-            config.append("• Weekly regen → balance freshness vs. compute cost.")
-        elif "monthly" in regen:
-            config.append("• Monthly regen → schedule performance benchmarks.")
-        elif "custom" in regen:
-            config.append("• Custom regen → integrate with your CI/CD pipeline.")
-
-        # S6 → evaluation metrics
-        eval_crit = data.get("S6","").lower()
-        if "statistical" in eval_crit:
-            config.append("• Use KS test, Chi-square for marginal distribution checks.")
-        if "ml model" in eval_crit:
-            config.append("• Train downstream models and compare accuracy/F1.")
-        if "privacy risk" in eval_crit:
-            config.append("• Run membership inference and attribute inference attacks.")
-        if "user feedback" in eval_crit:
-            config.append("• Collect domain expert feedback on synthetic realism.")
-
-        # S7 → hardware recommendations
-        hw = data.get("S7","").lower()
-        if "gpu" in hw or "tpu" in hw:
-            config.append("• Leverage cloud GPUs/TPUs for faster model convergence.")
-        elif "cpu" in hw:
-            config.append("• CPU only → use lightweight, non-neural methods (Copula, Bayesian).")
-        elif "tee" in hw:
-            config.append("• TEE available → run sensitive data synth inside enclaves.")
-        
-        # Final fallback tip
-        config.append("")
-        config.append("For more, see: SDV (sdv.dev), CTGAN docs, or your preferred synth library.")
-
-
-    elif tool == "Secure Multiparty Computation":
-    # MPC logic
-        try:
-            # Number of parties and maximum corruptions
-            n = int(data.get("S1", 0))
-            t = int(data.get("S2", 0))
-        except ValueError:
-            n, t = None, None
-
-        config.append("Your MPC configuration:")
-        if n is None or t is None:
-            config.append("  ⛔ Invalid inputs—please enter integers for parties and threshold.")
-        else:
-            config.append(f"  • Total parties (n): {n}")
-            config.append(f"  • Max corruptions tolerated (t): {t}")
-            config.append("")
-            config.append("Protocol recommendations:")
-
-        # Choose protocol family by adversary tolerance
-        # Semi-honest BGW/GMW if t < n/2; malicious SPDZ if t < n
-        if  t < n/2:
-            config.append("  – Semi-honest model (t < n/2): Consider BGW or GMW (Shamir secret‐sharing).")
-        elif t < n:
-            config.append("  – Malicious model (t < n): Consider SPDZ/MASCOT or HoneyBadgerMPC for stronger security.")
-        else:
-            config.append("  – Warning: t must be < n for security—please adjust your threshold.")
-            config.append("")
-            config.append("Libraries & frameworks:")
-            config.append("  • MP-SPDZ (C++): supports many protocols & security levels.")
-            config.append("  • SCALE-MAMBA (Python/C++): friendly DSL & semi-honest/SPDZ.")
-            config.append("  • VIFF (Python): easy prototyping, semi-honest only.")
-            config.append("  • Sharemind (Rust): commercial‐grade with high‐performance optimizations.")
-
-        config.append("")
-        config.append("Tip: choose your n-of-t threshold based on your trust & threat model.")
-
-    
-    elif tool == "Trusted Execution Environments":
-        # TEE logic
-        config.append("Your TEE settings:")
-        t1 = data.get("T1", "")
-        t2 = data.get("T2", "")
-        config.append(f"  Records: {t1}")
-        config.append(f"  Enclave available: {t2}")
-        config.append("")
-        config.append("Implementation tips:")
-        if "Intel" in t2:
-            config.append(
-              "• Deploy your code in Intel SGX/AMD SEV enclaves. "
-              f"For datasets {t1}, use chunked loading to stay within enclave memory limits."
-            )
-        elif "Nitro" in t2:
-            config.append(
-              "• Use AWS Nitro Enclaves with KMS attestation—follow AWS Nitro CLI docs."
-            )
-        else:
-            config.append(
-              "• No hardware enclaves available. Consider Azure Confidential VMs "
-              "or fallback to MPC for compute isolation."
-            )
-
-    elif tool == "k-anonymity & ℓ-diversity":
-        # k-anonymity logic
-        config.append("Your anonymization settings:")
-        k1 = data.get("K1", "")
-        k2 = data.get("K2", "")
-        config.append(f"  Dataset size: {k1}")
-        config.append(f"  Risk tolerance: {k2}")
-
-        # map to k-value
-        size_map = {
-            "<10k":      {"Very low (<1%)": 5,   "Low (1–5%)": 10,  "Moderate (5–10%)": 20},
-            "10k–100k":  {"Very low (<1%)": 10,  "Low (1–5%)": 20,  "Moderate (5–10%)": 50},
-            "100k–1M":   {"Very low (<1%)": 20,  "Low (1–5%)": 50,  "Moderate (5–10%)": 100},
-            ">1M":       {"Very low (<1%)": 50,  "Low (1–5%)": 100, "Moderate (5–10%)": 200}
-        }
-        k_val = size_map.get(k1, {}).get(k2)
-        l_map = {"Very low (<1%)": 2, "Low (1–5%)": 3, "Moderate (5–10%)": 5}
-        l_val = l_map.get(k2, 2)
-
-        config.append("")
-        if k_val:
-            config.append(f"• Generalize/suppress to achieve k={k_val} and ℓ={l_val}.")
-            config.append("  – k (anonymity): each record is indistinguishable from at least k–1 others sharing the same quasi-identifiers.")
-            config.append("  – ℓ (diversity): each such group must contain at least ℓ distinct sensitive-attribute values.")
-            config.append("  Use a library like ARX (Java) or sdcMicro (R/Python).")
-        else:
-            config.append("• Unable to derive k/ℓ for those choices—please adjust settings.")
-
-
-    else:
-        config.append(f"No wizard logic found for tool: {tool}")
+    if not isinstance(tool, str):
+        raise PayloadError(["'tool' must be a string"])
+    config = wizard_config(tool, data)
 
-    session["config"] = config
+    save_user_results(last_tool=tool, config=config)
     return jsonify({"redirect": url_for("wizard_results")})
 
 
@@ -589,19 +2406,13 @@ def wizard_submit():
 
 @app.get("/wizard/results")
 def wizard_results():
-    cfg         = session.get("config", [])
-    all_tools   = session.get("wizard_tools", [])
-    current     = session.get("last_tool", "")
+    stored      = load_user_results()
+    cfg         = stored.get("config", [])
+    all_tools   = [r["name"] for r in stored.get("ranked", [])[:3]]
+    current     = stored.get("last_tool", "")
 
     # drop any that look like policies/compliance
-    policy_keywords = (
-      "compliance", "policy", "regulation",
-      "ferpa", "hipaa", "gdpr", "foia", "ccpa", "coppa"
-    )
-    privacy_tools = [
-      t for t in all_tools
-      if not any(kw in t.lower() for kw in policy_keywords)
-    ]
+    privacy_tools = [t for t in all_tools if route_tool(t)["category"] != "policy"]
 
     return render_template(
         "wizard_results.html",
@@ -612,5 +2423,110 @@ def wizard_results():
 
 
 
+# -----------------------------------------------------------------------------
+# Static assets (bundles from `python cli.py build-assets`, fingerprinted)
+# -----------------------------------------------------------------------------
+def bundle_sources(name: str, static: Path) -> list[Path]:
+    return [static / src for src in ASSET_BUNDLES[name]]
+
+
+def sources_digest(paths) -> str:
+    h = hashlib.sha256()
+    for path in paths:
+        h.update(path.read_bytes())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def load_asset_manifest(out: Path = ASSET_DIR) -> dict[str, str]:
+    # served name -> hashed name, for bundles whose sources still match
+    try:
+        manifest = json.loads((out / ASSET_MANIFEST.name).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    static = Path(app.static_folder)
+    assets = {}
+    for name, entry in manifest.items():
+        try:
+            fresh = (name in ASSET_BUNDLES and (out / entry["file"]).is_file()
+                     and sources_digest(bundle_sources(name, static)) == entry["sources"])
+        except (OSError, KeyError, TypeError):
+            continue
+        if fresh:
+            assets[name] = entry["file"]
+    return assets
+
+
+with stage("assets"):
+    ASSETS = load_asset_manifest()
+
+
+@app.url_defaults
+def fingerprint_static(endpoint, values):
+    if endpoint == "static" and values.get("filename") in ASSETS:
+        values["filename"] = f"{ASSET_DIR.name}/{ASSETS[values['filename']]}"
+
+
+@app.route(f"/static/{ASSET_DIR.name}/<path:filename>")
+def static_asset(filename):
+    # The name carries the content hash, so the file is cacheable forever.
+    # A precompressed variant goes out as-is when the client accepts it;
+    # send_file hands the open file to wsgi.file_wrapper (sendfile(2) under
+    # gunicorn), or to the proxy with PETS_X_SENDFILE.
+    path = safe_join(str(ASSET_DIR), filename)
+    if (path is None or filename == ASSET_MANIFEST.name
+            or filename.endswith((".gz", ".br", ".tmp")) or not os.path.isfile(path)):
+        raise NotFound()
+    encoding = None
+    for enc, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if request.accept_encodings[enc] and os.path.isfile(path + suffix):
+            encoding, path = enc, path + suffix
+            break
+    resp = send_file(path, mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+                     conditional=True, max_age=ASSET_MAX_AGE)
+    if encoding:
+        resp.headers["Content-Encoding"] = encoding
+    resp.vary.add("Accept-Encoding")
+    resp.cache_control.public = True
+    resp.cache_control.immutable = True
+    return resp
+
+
+# -----------------------------------------------------------------------------
+# ASGI entry point:  uvicorn app:asgi_app
+# -----------------------------------------------------------------------------
+def __getattr__(name):
+    # `asgi_app` is built on first access, so WSGI workers never import
+    # asgiref (~25 ms of every cold start)
+    if name != "asgi_app":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    try:
+        from asgiref.wsgi import WsgiToAsgi     # optional; only for ASGI servers
+    except ImportError as exc:
+        raise ImportError("app:asgi_app needs asgiref (pip install asgiref); "
+                          "or serve app:app with a WSGI server") from exc
+    globals()["asgi_app"] = asgi = WsgiToAsgi(app)
+    return asgi
+
+
+# `python app.py <command> ...` runs `python cli.py <command> ...`, the
+# bench-* commands and --startup-report run bench.py's; with no arguments
+# it is the development server.
+BENCH_COMMANDS = {"bench-evaluate": "evaluate", "bench-pool": "pool", "bench-routes": "routes"}
+
+
 if __name__ == "__main__":
-    app.run(debug=True)
+    sys.modules.setdefault("app", sys.modules[__name__])    # so cli/bench reuse this module
+    argv = sys.argv[1:]
+    if "--startup-report" in argv:
+        import bench
+        argv.remove("--startup-report")
+        bench.main(["startup"] + argv)
+    elif argv and argv[0] in BENCH_COMMANDS:
+        import bench
+        bench.main([BENCH_COMMANDS[argv[0]]] + argv[1:])
+    elif argv:
+        import cli
+        cli.main(argv)
+    else:
+        app.run(debug=True)
@@ -0,0 +1,509 @@
+# bench.py
+
+import functools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from app import (
+    app, active_rules, evaluate, evaluate_batch, match_wizard, QuestionCatalog, ScoringEngine,
+)
+import cli
+from cli import imap_bounded, scoring_pool
+
+# Cold-start budget for `python bench.py startup`, in seconds from spawning
+# the interpreter to the first page served; over it, exit status 1.
+STARTUP_BUDGET = float(os.environ.get("PETS_STARTUP_BUDGET", 2.0))
+
+
+# -----------------------------------------------------------------------------
+# Reference scorer (the dict-walking evaluate() the engine replaced)
+# -----------------------------------------------------------------------------
+@functools.lru_cache(maxsize=2)
+def reference_tables(engine: ScoringEngine) -> tuple[dict, dict]:
+    # only the reference scorer below still wants the nested dicts
+    return engine.as_dicts()
+
+
+def evaluate_dicts(answers: dict):
+    # Reference dict-walking scorer the engine replaced; kept so
+    # `python bench.py evaluate` can check rankings and measure speedup.
+    rules = active_rules()
+    lookup, deal_map = reference_tables(rules.engine)
+    deal_col = rules.deal_col
+
+    votes = {}
+    params_out = []
+    vetoed = set()
+
+    # 1) Tally votes & collect params as before
+    for q_text, sel in answers.items():
+        sels = sel if isinstance(sel, list) else [sel]
+        for ans in sels:
+            entry = lookup.get(q_text, {}).get(ans)
+            if not entry: 
+                continue
+            for tech in entry["techs"]:
+                votes[tech] = votes.get(tech, 0) + 1
+            if entry["params"]:
+                params_out.append(entry["params"])
+
+    # 2) Apply any deal-breakers
+    #    Any PET listed under deal_map[q_text][ans] is vetoed
+    for q_text, sel in answers.items():
+        if not deal_col:
+            break
+        sels = sel if isinstance(sel, list) else [sel]
+        for ans in sels:
+            pets_to_veto = deal_map.get(q_text, {}).get(ans, [])
+            for pet in pets_to_veto:
+                vetoed.add(pet)
+
+    # 3) Filter out vetoed PETs entirely
+    for pet in vetoed:
+        votes.pop(pet, None)
+
+    # 4) Build the final ranked list
+    ranked = sorted(votes.items(), key=lambda kv: kv[1], reverse=True)
+    ranked_pets = [
+        {"name": tech, "score": cnt, "rationale": ("VETOED" if tech in vetoed else "Matches survey")}
+        for tech, cnt in ranked
+    ]
+
+    # 5) Deduplicate parameter suggestions
+    param_suggestions = sorted(set(params_out))
+
+    # 6) Prepare a summary of which PETs were vetoed and why
+    veto_summary = []
+    for pet in vetoed:
+        # find all (q,ans) that vetoed this pet
+        reasons = []
+        for q_text, sel in answers.items():
+            sels = sel if isinstance(sel, list) else [sel]
+            for ans in sels:
+                if pet in deal_map.get(q_text, {}).get(ans, []):
+                    reasons.append(f"{q_text} → {ans}")
+        veto_summary.append({"name": pet, "reasons": reasons})
+
+    return ranked_pets, param_suggestions, veto_summary
+
+
+# -----------------------------------------------------------------------------
+# Benchmarks
+# -----------------------------------------------------------------------------
+def random_survey(rng: random.Random, catalog: QuestionCatalog = None) -> dict:
+    # a plausible answer set: ~10% of questions skipped, multi-selects sampled
+    catalog = catalog or active_rules().catalog
+    answers = {}
+    for q in catalog.questions:
+        if rng.random() < 0.1:
+            continue
+        opts = q["options"]
+        if q["multi"]:
+            answers[q["text"]] = rng.sample(opts, rng.randint(1, len(opts)))
+        else:
+            answers[q["text"]] = rng.choice(opts)
+    return answers
+
+
+def cmd_bench_evaluate(args):
+    import timeit
+    rng = random.Random(args.seed)
+    # as the validator spells them, which is what the reference scorer expects
+    validator = active_rules().validator
+    surveys = [validator.parse(random_survey(rng))[0] for _ in range(args.surveys)]
+
+    for answers in surveys:
+        want, got = evaluate_dicts(answers), evaluate(answers)
+        if want[:2] != got[:2] or sorted(map(str, want[2])) != sorted(map(str, got[2])):
+            raise SystemExit(f"engine disagrees with reference for {answers!r}")
+    if evaluate_batch(surveys) != [evaluate(a) for a in surveys]:
+        raise SystemExit("evaluate_batch disagrees with evaluate")
+
+    # the engine is timed on validated rows, as the routes call it
+    engine = active_rules().engine
+    rows = [validator.parse(a)[1] for a in surveys]
+
+    def run(fn, inputs):
+        best = min(timeit.repeat(lambda: [fn(a) for a in inputs], number=1, repeat=args.repeat))
+        return best / len(surveys) * 1e6
+
+    ref, eng = run(evaluate_dicts, surveys), run(engine.score, rows)
+    best = min(timeit.repeat(lambda: engine.score_batch(rows), number=1, repeat=args.repeat))
+    batch = best / len(surveys) * 1e6
+    print(f"{len(surveys)} surveys, best of {args.repeat}")
+    print(f"  evaluate_dicts  {ref:8.1f} µs/survey")
+    print(f"  ScoringEngine   {eng:8.1f} µs/survey   ({ref / eng:.2f}x)")
+    print(f"  evaluate_batch  {batch:8.1f} µs/survey   ({ref / batch:.2f}x)")
+
+
+def _bench_pool_task(task) -> int:
+    # generate the chunk inside the worker so we time scoring, not pickling
+    seed, n = task
+    rng = random.Random(seed)
+    batch = [cli._pool_validator.parse(random_survey(rng))[1] for _ in range(n)]
+    results = cli._pool_engine.score_batch(batch)
+    return sum(len(ranked) for ranked, _, _ in results)
+
+
+def worker_counts() -> list[int]:
+    cores = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cores:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cores:
+        counts.append(cores)
+    return counts
+
+
+def cmd_bench_pool(args):
+    counts = [int(w) for w in args.workers.split(",")]
+    tasks = [(seed, min(args.chunk_size, args.surveys - start))
+             for seed, start in enumerate(range(0, args.surveys, args.chunk_size))]
+    print(f"{args.surveys} synthetic surveys, chunks of {args.chunk_size}, "
+          f"{os.cpu_count()} cores")
+    base = None
+    for workers in counts:
+        with scoring_pool(workers) as pool:
+            start = time.perf_counter()
+            for _ in imap_bounded(pool, _bench_pool_task, tasks, 2 * workers):
+                pass
+            elapsed = time.perf_counter() - start
+        base = base or elapsed
+        print(f"  workers={workers:<3} {elapsed:8.2f} s  {args.surveys / elapsed:10.0f} surveys/s"
+              f"  speedup {base / elapsed:5.2f}x  efficiency {base / elapsed / workers:4.0%}")
+
+
+# -- route latency benchmark ---------------------------------------------------
+WIZARD_TOOLS = (
+    "Differential Privacy", "Secure Multi-Party Computation", "Synthetic Data Generation",
+    "Trusted Execution Environments", "k-anonymity/l-diversity",
+)
+
+
+def random_wizard_payload(rng: random.Random, tool: str) -> dict:
+    display, questions = match_wizard(tool)
+    payload = {"tool": display}
+    for q in questions:
+        if q.get("input_type") == "number":
+            payload[q["id"]] = rng.randint(1, 20)
+        else:
+            payload[q["id"]] = rng.choice(q["options"])
+    return payload
+
+
+class TestClientDriver:
+    # in-process: Flask's test client, no sockets
+    def __init__(self):
+        self.client = app.test_client()
+
+    def get(self, path, query=None):
+        resp = self.client.get(path, query_string=query)
+        return resp.status_code, resp.get_data()
+
+    def post(self, path, payload):
+        resp = self.client.post(path, json=payload)
+        return resp.status_code, resp.get_data()
+
+
+class HTTPDriver:
+    # a real local HTTP server on a background thread, driven over sockets
+    def __init__(self):
+        from werkzeug.serving import WSGIRequestHandler, make_server
+        from http.cookiejar import CookieJar
+        import urllib.request
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        self.server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+        self._request = urllib.request.Request
+
+    def _open(self, req):
+        import urllib.error
+        try:
+            with self.opener.open(req) as resp:
+                return resp.status, resp.read()
+        except urllib.error.HTTPError as err:
+            return err.code, err.read()
+
+    def get(self, path, query=None):
+        from urllib.parse import urlencode
+        url = self.base + path + ("?" + urlencode(query) if query else "")
+        return self._open(self._request(url))
+
+    def post(self, path, payload):
+        body = json.dumps(payload).encode("utf-8")
+        return self._open(self._request(self.base + path, data=body, method="POST",
+                                        headers={"Content-Type": "application/json"}))
+
+    def close(self):
+        self.server.shutdown()
+
+
+def route_scenarios(driver, rng: random.Random) -> dict:
+    # name → zero-arg callable issuing one request with a fresh random payload
+    def results_page():
+        return driver.get(results_url)
+
+    status, body = driver.post("/results", random_survey(rng))
+    results_url = json.loads(body)["redirect"]
+    return {
+        "GET /":               lambda: driver.get("/"),
+        "POST /results":       lambda: driver.post("/results", random_survey(rng)),
+        "GET /results":        results_page,
+        "GET /wizard":         lambda: driver.get("/wizard", {"tool": rng.choice(WIZARD_TOOLS)}),
+        "POST /wizard/submit": lambda: driver.post("/wizard/submit",
+                                                   random_wizard_payload(rng, rng.choice(WIZARD_TOOLS))),
+    }
+
+
+def measure_route(call, requests: int, warmup: int, alloc_samples: int) -> dict:
+    import tracemalloc
+    for _ in range(warmup):
+        call()
+
+    latencies, errors = [], 0
+    start = time.perf_counter()
+    for _ in range(requests):
+        t0 = time.perf_counter()
+        status, _ = call()
+        latencies.append(time.perf_counter() - t0)
+        errors += status >= 400
+    elapsed = time.perf_counter() - start
+
+    # allocations in a separate pass: tracemalloc would distort the timings
+    allocs = []
+    tracemalloc.start()
+    try:
+        for _ in range(alloc_samples):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            call()
+            allocs.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+
+    ms = np.asarray(latencies) * 1000
+    return {
+        "requests":      requests,
+        "errors":        errors,
+        "mean_ms":       round(float(ms.mean()), 3),
+        "p50_ms":        round(float(np.percentile(ms, 50)), 3),
+        "p95_ms":        round(float(np.percentile(ms, 95)), 3),
+        "p99_ms":        round(float(np.percentile(ms, 99)), 3),
+        "rps":           round(requests / elapsed, 1),
+        "alloc_kib_p50": round(float(np.percentile(allocs, 50)) / 1024, 1) if allocs else None,
+    }
+
+
+def compare_runs(baseline: dict, current: dict, threshold: float) -> list[str]:
+    regressions = []
+    for name, now in current["routes"].items():
+        was = baseline.get("routes", {}).get(name)
+        if not was:
+            continue
+        ratio = now["p95_ms"] / was["p95_ms"] if was["p95_ms"] else 1.0
+        flag = "  REGRESSION" if ratio > threshold else ""
+        print(f"  {name:<20} p95 {was['p95_ms']:8.2f} → {now['p95_ms']:8.2f} ms  ({ratio:4.2f}x){flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def cmd_bench_routes(args):
+    rng = random.Random(args.seed)
+    report = {
+        "meta": {
+            "mode":      args.mode,
+            "requests":  args.requests,
+            "rules":     active_rules().version,
+            "python":    sys.version.split()[0],
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        },
+        "routes": {},
+    }
+    driver = HTTPDriver() if args.mode == "http" else TestClientDriver()
+    # over HTTP the per-connection server threads and socket buffers swamp
+    # tracemalloc, so allocations are only meaningful in-process
+    alloc_samples = args.alloc_samples if args.mode == "client" else 0
+    try:
+        for name, call in route_scenarios(driver, rng).items():
+            if args.routes and name not in args.routes:
+                continue
+            stats = measure_route(call, args.requests, args.warmup, alloc_samples)
+            report["routes"][name] = stats
+            print(f"  {name:<20} p50 {stats['p50_ms']:7.2f}  p95 {stats['p95_ms']:7.2f}  "
+                  f"p99 {stats['p99_ms']:7.2f} ms  {stats['rps']:8.1f} req/s  "
+                  f"{stats['alloc_kib_p50'] or '-'} KiB/req  errors {stats['errors']}")
+    finally:
+        if isinstance(driver, HTTPDriver):
+            driver.close()
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
+        print(f"wrote {args.out}")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        print(f"compared with {args.compare}:")
+        if baseline.get("meta", {}).get("mode") != args.mode:
+            print(f"  note: baseline was run in {baseline.get('meta', {}).get('mode')!r} mode")
+        if compare_runs(baseline, report, args.threshold):
+            raise SystemExit(1)
+
+
+# -----------------------------------------------------------------------------
+# Startup report (cold start of a fresh worker process)
+# -----------------------------------------------------------------------------
+STARTUP_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+phases = list(app.BOOT_PHASES)
+status = app.app.test_client().get("/").status_code
+t2 = time.perf_counter()
+ready = time.time()
+del app.BOOT_PHASES[:]
+if "from-sheet" in sys.argv:
+    with app.stage("compile_sheet"):
+        app.build_snapshot()
+print(json.dumps({"ready_at": ready, "import_s": t1 - t0, "first_request_s": t2 - t1,
+                  "status": status, "phases": phases, "fallback": app.BOOT_PHASES}))
+"""
+
+
+def import_costs(importtime: str) -> list[tuple[str, float]]:
+    # `-X importtime` lists a module after everything it imported, indented
+    # one level deeper; keep the modules app.py itself imports, in ms
+    costs, pending = [], []
+    for line in importtime.splitlines():
+        if not line.startswith("import time:") or line.endswith("imported package"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            pending.append((name.strip(), int(cumulative) / 1000))
+        elif depth == 0:
+            if name.strip() == app.import_name:
+                costs = pending
+            pending = []
+    return sorted(costs, key=lambda c: -c[1])
+
+
+def startup_probe(importtime: bool = False, from_sheet: bool = False) -> dict:
+    # one cold start: a new interpreter imports the app and serves GET /
+    import subprocess
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", STARTUP_PROBE]
+    cmd += ["from-sheet"] if from_sheet else []
+    env = dict(os.environ, PETS_STARTUP_TRACE="1")
+    started = time.time()
+    proc = subprocess.run(cmd, cwd=Path(app.root_path), env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise SystemExit(f"startup probe failed:\n{proc.stderr[-4000:]}")
+    report = json.loads(proc.stdout.splitlines()[-1])
+    report["cold_start_s"] = report.pop("ready_at") - started
+    if importtime:
+        report["imports"] = import_costs(proc.stderr)
+    return report
+
+
+def print_phases(phases: list):
+    for name, depth, seconds in phases:
+        print(f"  {'  ' * depth}{name:<{24 - 2 * depth}} {seconds * 1000:8.1f} ms")
+
+
+def cmd_startup_report(args):
+    # The -X importtime run only supplies the per-module breakdown; its own
+    # overhead keeps it out of the timed runs.
+    traced = startup_probe(importtime=True, from_sheet=args.from_sheet)
+    runs = sorted((startup_probe() for _ in range(max(args.runs, 1))), key=lambda r: r["cold_start_s"])
+    median = runs[len(runs) // 2]
+    cold = median["cold_start_s"]
+    over = args.budget > 0 and cold > args.budget
+
+    print(f"cold start {cold * 1000:.1f} ms (median of {len(runs)}: "
+          f"{runs[0]['cold_start_s'] * 1000:.1f}-{runs[-1]['cold_start_s'] * 1000:.1f} ms), "
+          f"budget {args.budget * 1000:.0f} ms{'  OVER BUDGET' if over else ''}")
+    print(f"  import app               {median['import_s'] * 1000:8.1f} ms")
+    print(f"  first GET / ({median['status']})         {median['first_request_s'] * 1000:8.1f} ms")
+    print("loading phases (nested under their parent):")
+    print_phases(median["phases"])
+    if traced["fallback"]:
+        print("compiling from the spreadsheet (missing/stale snapshot, hot reload):")
+        print_phases(traced["fallback"])
+    print(f"imports by cumulative time (-X importtime, top {args.top}):")
+    for name, ms in traced["imports"][:args.top]:
+        print(f"  {name:<24} {ms:8.1f} ms")
+
+    if args.out:
+        report = {"budget_s": args.budget, "cold_start_s": cold,
+                  "runs_s": [r["cold_start_s"] for r in runs], "median": median,
+                  "imports": traced["imports"], "fallback": traced["fallback"]}
+        Path(args.out).write_text(json.dumps(report, indent=2))
+        print(f"wrote {args.out}")
+    if over:
+        raise SystemExit(1)
+
+# -----------------------------------------------------------------------------
+# Command line
+# -----------------------------------------------------------------------------
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="PET Advisor benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("evaluate", help="microbenchmark the scoring engine")
+    p.add_argument("--surveys", type=int, default=2000)
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=cmd_bench_evaluate)
+
+    p = sub.add_parser("pool", help="measure process-pool scaling on synthetic surveys")
+    p.add_argument("--surveys", type=int, default=1_000_000)
+    p.add_argument("--chunk-size", type=int, default=2000)
+    p.add_argument("--workers", default=",".join(str(w) for w in worker_counts()),
+                   help="comma-separated worker counts to try")
+    p.set_defaults(func=cmd_bench_pool)
+
+    p = sub.add_parser("routes", help="latency/throughput benchmark for every page route")
+    p.add_argument("--mode", choices=("client", "http"), default="client",
+                   help="in-process test client, or a local HTTP server")
+    p.add_argument("--requests", type=int, default=500, help="timed requests per route")
+    p.add_argument("--warmup", type=int, default=20)
+    p.add_argument("--alloc-samples", type=int, default=50)
+    p.add_argument("--route", dest="routes", action="append", help="only this route (repeatable)")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", help="save the report as JSON")
+    p.add_argument("--compare", help="baseline JSON report; exit 1 on a p95 regression")
+    p.add_argument("--threshold", type=float, default=1.25, help="allowed p95 ratio vs baseline")
+    p.set_defaults(func=cmd_bench_routes)
+
+    p = sub.add_parser("startup", help="time imports and loading phases of a fresh worker; "
+                                       "exit 1 when the cold start is over --budget")
+    p.add_argument("--budget", type=float, default=STARTUP_BUDGET,
+                   help="cold-start budget in seconds (0 = report only)")
+    p.add_argument("--runs", type=int, default=3, help="timed cold starts (the median is used)")
+    p.add_argument("--top", type=int, default=15, help="imports to list")
+    p.add_argument("--from-sheet", action="store_true",
+                   help="also time compiling the spreadsheet (the no-snapshot path)")
+    p.add_argument("--out", "--report-out", help="save the report as JSON")
+    p.set_defaults(func=cmd_startup_report)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,776 @@
+# cli.py
+
+import csv
+import gzip
+import hashlib
+import itertools
+import json
+import math
+import os
+import pickle
+import random
+import re
+import sys
+import tempfile
+import time
+from collections import Counter, deque
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from app import (
+    app, active_rules, answers_digest, build_snapshot, bundle_sources, compile_catalog,
+    dp_calculator, grid_axis, grid_json, grid_table, mpc_calculator, read_submissions,
+    sources_digest, split_policies, write_snapshot, PayloadError, QuestionCatalog, ScoringEngine,
+    SurveyValidator, ASSET_BUNDLES, ASSET_DIR, ASSET_MANIFEST, DATA_FILE, PRECOMPUTED_FILE,
+    PRECOMPUTED_FORMAT, SNAPSHOT_FILE, SUBMISSION_LOG,
+)
+
+
+# -----------------------------------------------------------------------------
+# Static asset build (see load_asset_manifest() in app.py for the serving side)
+# -----------------------------------------------------------------------------
+CSS_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+CSS_SPACE = re.compile(r"\s*([{};,>])\s*|(:)\s+")
+JS_LINE_COMMENT = re.compile(r"^\s*//.*$", re.M)
+
+
+def minify_css(text: str) -> str:
+    # comments, runs of whitespace, and the spaces around punctuation; a
+    # space *before* ':' is kept ("a :hover" is not "a:hover")
+    text = " ".join(CSS_COMMENT.sub("", text).split())
+    text = CSS_SPACE.sub(lambda m: m.group(1) or m.group(2), text)
+    return text.replace(";}", "}").strip()
+
+
+def minify_js(text: str) -> str:
+    # deliberately shallow: whole-line comments, indentation, blank lines
+    lines = (line.strip() for line in JS_LINE_COMMENT.sub("", text).splitlines())
+    return "\n".join(line for line in lines if line) + "\n"
+
+
+MINIFIERS = {".css": minify_css, ".js": minify_js}
+
+
+def build_assets(out: Path = ASSET_DIR) -> dict:
+    # Writes <stem>.<hash><ext> (+ .gz, + .br if brotli is installed) for
+    # every bundle, then the manifest. Older hashed files are left in place
+    # for pages still being served by workers on the previous build.
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+    static = Path(app.static_folder)
+    out.mkdir(parents=True, exist_ok=True)
+    manifest = {}
+    for name in ASSET_BUNDLES:
+        sources = bundle_sources(name, static)
+        stem, ext = os.path.splitext(name)
+        minify = MINIFIERS.get(ext, lambda text: text)
+        body = "\n".join(minify(p.read_text(encoding="utf-8")) for p in sources).encode("utf-8")
+        hashed = f"{stem}.{hashlib.sha256(body).hexdigest()[:12]}{ext}"
+        variants = {"": body, ".gz": gzip.compress(body, 9, mtime=0)}
+        if brotli is not None:
+            variants[".br"] = brotli.compress(body, quality=11)
+        for suffix, data in variants.items():
+            if suffix and len(data) >= len(body):
+                continue
+            tmp = out / f"{hashed}{suffix}.tmp"
+            tmp.write_bytes(data)
+            os.replace(tmp, out / f"{hashed}{suffix}")
+        manifest[name] = {"file": hashed, "sources": sources_digest(sources),
+                          "bytes": len(body), "encodings": [s[1:] for s in variants if s]}
+    tmp = out / (ASSET_MANIFEST.name + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, out / ASSET_MANIFEST.name)
+    return manifest
+
+
+
+# -----------------------------------------------------------------------------
+# Offline batch scoring (JSON Lines in → JSON Lines out)
+# -----------------------------------------------------------------------------
+def read_jsonl(fh):
+    for line in fh:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def chunked(iterable, size: int):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def score_chunk(chunk: list, engine: "ScoringEngine" = None,
+                validator: "SurveyValidator" = None) -> list:
+    # Each record is either an answers object or {"id": …, "answers": {…}},
+    # checked exactly as POST /api/evaluate checks it; an invalid one comes
+    # back as {"id", "error", "problems"} in its place.
+    rules = active_rules()
+    engine, validator = engine or rules.engine, validator or rules.validator
+    envelopes = [r if isinstance(r, dict) and isinstance(r.get("answers"), dict) else {"answers": r}
+                 for r in chunk]
+    parsed = []
+    for env in envelopes:
+        try:
+            parsed.append(validator.parse(env["answers"])[1])
+        except PayloadError as exc:
+            parsed.append(exc)
+    results = iter(engine.score_batch([p for p in parsed if not isinstance(p, PayloadError)]))
+    out = []
+    for env, rows in zip(envelopes, parsed):
+        rec = {"id": env["id"]} if "id" in env else {}
+        if isinstance(rows, PayloadError):
+            rec.update(error="invalid payload", problems=rows.problems)
+        else:
+            ranked, params, vetoed = next(results)
+            rec.update(ranked=ranked, params=params, vetoed=vetoed)
+        out.append(rec)
+    return out
+
+
+def score_records(records, chunk_size: int = 1000):
+    # Yields one output record per input, in order, a chunk at a time.
+    for chunk in chunked(records, chunk_size):
+        yield from score_chunk(chunk)
+
+
+# -----------------------------------------------------------------------------
+# Parallel batch scoring (process pool over a memory-mapped rule table)
+# -----------------------------------------------------------------------------
+_pool_engine = None     # per-worker engine and validator, set in _pool_init()
+_pool_validator = None
+
+
+def _pool_init(spec: dict):
+    global _pool_engine, _pool_validator
+    _pool_engine = ScoringEngine.attach_tables(spec)
+    _pool_validator = SurveyValidator(compile_catalog(spec["questions"]), _pool_engine)
+
+
+def _pool_score(chunk: list) -> list:
+    return score_chunk(chunk, _pool_engine, _pool_validator)
+
+
+@contextmanager
+def scoring_pool(workers: int):
+    with tempfile.TemporaryDirectory(prefix="pets-") as tmp:
+        rules = active_rules()
+        spec = rules.engine.export_tables(Path(tmp) / "tables.bin")
+        spec["questions"] = rules.catalog.as_list()     # for the workers' validators
+        import multiprocessing      # CLI batch paths only; not worth a worker's boot
+        with multiprocessing.Pool(workers, initializer=_pool_init, initargs=(spec,)) as pool:
+            yield pool
+
+
+def imap_bounded(pool, func, tasks, window: int):
+    # Like pool.imap(), but never has more than `window` tasks in flight, so
+    # a multi-GB input is not slurped into the task queue ahead of the workers.
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.apply_async(func, (task,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def score_records_parallel(records, workers: int, chunk_size: int = 1000):
+    # Same output, same order as score_records(), scored across `workers`.
+    if workers <= 1:
+        yield from score_records(records, chunk_size)
+        return
+    with scoring_pool(workers) as pool:
+        for out in imap_bounded(pool, _pool_score, chunked(records, chunk_size), 2 * workers):
+            yield from out
+
+
+def open_stream(path: str, mode: str, newline: str = None):
+    if path == "-":
+        return open((sys.stdin if "r" in mode else sys.stdout).fileno(), mode,
+                    encoding="utf-8", newline=newline, closefd=False)
+    return open(path, mode, encoding="utf-8", newline=newline)
+
+
+def cmd_score(args):
+    n = invalid = 0
+    with open_stream(args.inp, "r") as src, open_stream(args.out, "w") as dst:
+        for out in score_records_parallel(read_jsonl(src), args.workers, args.chunk_size):
+            dst.write(json.dumps(out, ensure_ascii=False) + "\n")
+            n += 1
+            invalid += "error" in out
+    print(f"scored {n} surveys ({invalid} invalid)", file=sys.stderr)
+
+
+def cmd_submissions(args):
+    # JSON Lines that `score` and `export` accept as input (re-scoring)
+    since = datetime.fromisoformat(args.since).timestamp() if args.since else None
+    n = 0
+    with open_stream(args.out, "w") as dst:
+        for rec in read_submissions(args.db, since, args.rules):
+            if not args.with_results:
+                rec = {k: rec[k] for k in ("id", "ts", "rules", "answers")}
+            dst.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            n += 1
+    print(f"read {n} submissions from {args.db}", file=sys.stderr)
+
+
+# -----------------------------------------------------------------------------
+# Analytics export (scored surveys → CSV / Parquet, plus running aggregates)
+# -----------------------------------------------------------------------------
+# one row per (survey, technique): recommended ones with their rank and
+# score, vetoed ones with the deal-breaker answers that removed them
+EXPORT_COLUMNS = ("survey", "technique", "status", "rank", "score", "reasons")
+
+
+def export_rows(records: list, start: int):
+    # Surveys without an "id" are numbered by their position in the input;
+    # invalid ones (see score_chunk()) have no rows.
+    for i, rec in enumerate(records, start):
+        if "error" in rec:
+            continue
+        survey = str(rec.get("id", i))
+        for rank, pet in enumerate(rec["ranked"], 1):
+            yield survey, pet["name"], "recommended", rank, pet["score"], []
+        for pet in rec["vetoed"]:
+            yield survey, pet["name"], "vetoed", None, None, pet["reasons"]
+
+
+class ExportAggregates:
+    # Running per-technique totals, folded in a chunk at a time. Memory is
+    # bounded by the rule set (techniques × deal-breaker answers), not by
+    # the number of surveys.
+
+    def __init__(self, engine: ScoringEngine):
+        self.techniques = engine.techniques
+        self.technique_id = engine.technique_id
+        n = len(self.techniques)
+        self.surveys = 0
+        self.invalid = 0
+        self.recommended = np.zeros(n, dtype=np.int64)
+        self.top = np.zeros(n, dtype=np.int64)
+        self.score_sum = np.zeros(n, dtype=np.int64)
+        self.vetoed = np.zeros(n, dtype=np.int64)
+        self.vetoed_by: list[Counter] = [Counter() for _ in range(n)]
+
+    def add(self, records: list):
+        tid, n = self.technique_id, len(self.techniques)
+        ranked, scores, top, vetoed = [], [], [], []
+        invalid = 0
+        for rec in records:
+            if "error" in rec:
+                invalid += 1
+                continue
+            if rec["ranked"]:
+                top.append(tid[rec["ranked"][0]["name"]])
+            for pet in rec["ranked"]:
+                ranked.append(tid[pet["name"]])
+                scores.append(pet["score"])
+            for pet in rec["vetoed"]:
+                t = tid[pet["name"]]
+                vetoed.append(t)
+                self.vetoed_by[t].update(pet["reasons"])
+        self.surveys += len(records) - invalid
+        self.invalid += invalid
+        self.recommended += np.bincount(ranked, minlength=n)
+        self.score_sum += np.bincount(ranked, weights=scores, minlength=n).astype(np.int64)
+        self.top += np.bincount(top, minlength=n)
+        self.vetoed += np.bincount(vetoed, minlength=n)
+
+    def summary(self) -> dict:
+        order = np.lexsort((self.vetoed, -self.recommended))
+        return {
+            "surveys": self.surveys,
+            "invalid": self.invalid,
+            "techniques": [
+                {
+                    "name":        self.techniques[t],
+                    "recommended": int(self.recommended[t]),
+                    "top_ranked":  int(self.top[t]),
+                    "mean_score":  round(self.score_sum[t] / self.recommended[t], 3)
+                                   if self.recommended[t] else None,
+                    "vetoed":      int(self.vetoed[t]),
+                    "vetoed_by":   dict(self.vetoed_by[t].most_common()),
+                }
+                for t in order.tolist()
+                if self.recommended[t] or self.vetoed[t]
+            ],
+        }
+
+
+class CSVExportWriter:
+    def __init__(self, fh):
+        self.writer = csv.writer(fh)
+        self.writer.writerow(EXPORT_COLUMNS)
+
+    def write(self, rows):
+        self.writer.writerows(
+            (survey, tech, status, rank, score, " | ".join(reasons))
+            for survey, tech, status, rank, score, reasons in rows
+        )
+
+    def close(self):
+        pass
+
+
+class ParquetExportWriter:
+    # One row group per chunk, so the file is never held in memory.
+
+    def __init__(self, path: str):
+        import pyarrow as pa            # optional; only needed for --format parquet
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.schema = pa.schema([
+            ("survey", pa.string()),
+            ("technique", pa.string()),
+            ("status", pa.string()),
+            ("rank", pa.int32()),
+            ("score", pa.int64()),
+            ("reasons", pa.list_(pa.string())),
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+
+    def write(self, rows):
+        columns = list(zip(*rows))
+        if not columns:
+            return
+        arrays = [self.pa.array(col, type=field.type) for col, field in zip(columns, self.schema)]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def export_format(args) -> str:
+    if args.format:
+        return args.format
+    return "parquet" if args.out.endswith(".parquet") else "csv"
+
+
+def cmd_export(args):
+    fmt = export_format(args)
+    if fmt == "parquet" and args.out == "-":
+        raise SystemExit("--format parquet needs an --out file")
+
+    agg = ExportAggregates(active_rules().engine)
+    with ExitStack() as stack:
+        src = stack.enter_context(open_stream(args.inp, "r"))
+        if fmt == "parquet":
+            try:
+                writer = ParquetExportWriter(args.out)
+            except ImportError:
+                raise SystemExit("--format parquet needs pyarrow (pip install pyarrow)")
+        else:
+            writer = CSVExportWriter(stack.enter_context(open_stream(args.out, "w", newline="")))
+        stack.callback(writer.close)
+
+        scored = score_records_parallel(read_jsonl(src), args.workers, args.chunk_size)
+        for chunk in chunked(scored, args.chunk_size):
+            writer.write(export_rows(chunk, agg.surveys + agg.invalid))
+            agg.add(chunk)
+
+    summary = agg.summary()
+    if args.summary:
+        with open_stream(args.summary, "w") as fh:
+            json.dump(summary, fh, ensure_ascii=False, indent=2)
+            fh.write("\n")
+    print(f"exported {agg.surveys} surveys ({fmt}), skipped {agg.invalid} invalid", file=sys.stderr)
+    for t in summary["techniques"]:
+        print(f"  {t['name']:<40} recommended {t['recommended']:>10}  "
+              f"top {t['top_ranked']:>10}  vetoed {t['vetoed']:>10}", file=sys.stderr)
+
+
+# -----------------------------------------------------------------------------
+# Answer-space precomputation and sensitivity report
+# -----------------------------------------------------------------------------
+def reachable_choices(q) -> list:
+    # every answer the UI accepts: one option, or a non-empty set of them
+    opts = list(q["options"])
+    if not q["multi"]:
+        return opts
+    return [list(c) for k in range(1, len(opts) + 1) for c in itertools.combinations(opts, k)]
+
+
+def is_shown(q, answers: dict, catalog: QuestionCatalog) -> bool:
+    # as the UI decides it: hidden unless the parent was given exactly
+    # depends_value (a missing parent never is)
+    dep = q.get("depends_on")
+    return not dep or answers.get(catalog.id_to_text.get(dep)) == q["depends_value"]
+
+
+def answer_space_size(catalog: QuestionCatalog) -> int:
+    # dependents multiply in only under the parent answer that shows them
+    children: dict[str, list] = {}
+    for q in catalog.questions:
+        if q.get("depends_on"):
+            children.setdefault(q["depends_on"], []).append(q)
+    total = 1
+    for q in catalog.questions:
+        if q.get("depends_on"):
+            continue
+        kids = children.get(q["id"], [])
+        total *= sum(
+            math.prod(len(reachable_choices(k)) for k in kids if k["depends_value"] == c)
+            for c in reachable_choices(q)
+        )
+    return total
+
+
+def enumerate_answers(catalog: QuestionCatalog):
+    questions = catalog.questions
+
+    def walk(i: int, answers: dict):
+        if i == len(questions):
+            yield dict(answers)
+            return
+        q = questions[i]
+        if not is_shown(q, answers, catalog):
+            yield from walk(i + 1, answers)
+            return
+        for choice in reachable_choices(q):
+            answers[q["text"]] = choice
+            yield from walk(i + 1, answers)
+        del answers[q["text"]]
+
+    return walk(0, {})
+
+
+def sample_answers(rng: random.Random, catalog: QuestionCatalog) -> dict:
+    # uniform over each shown question's reachable choices
+    answers = {}
+    for q in catalog.questions:
+        if not is_shown(q, answers, catalog):
+            continue
+        if q["multi"]:
+            picked = []
+            while not picked:
+                picked = [o for o in q["options"] if rng.random() < 0.5]
+            answers[q["text"]] = picked
+        else:
+            answers[q["text"]] = rng.choice(q["options"])
+    return answers
+
+
+def fix_visibility(answers: dict, rng: random.Random, catalog: QuestionCatalog) -> dict:
+    # after a change, drop answers to questions that are now hidden and
+    # answer the ones that just appeared
+    for q in catalog.questions:
+        if not is_shown(q, answers, catalog):
+            answers.pop(q["text"], None)
+        elif q["text"] not in answers:
+            answers[q["text"]] = rng.choice(reachable_choices(q))
+    return answers
+
+
+def perturbations(answers: dict, rng: random.Random, catalog: QuestionCatalog):
+    # every survey one answer away: (question id, option, how, survey)
+    for q in catalog.questions:
+        current = answers.get(q["text"])
+        if current is None:
+            continue
+        for opt in q["options"]:
+            if q["multi"]:
+                if opt in current:
+                    if len(current) == 1:
+                        continue
+                    how, changed = "remove", [o for o in current if o != opt]
+                else:
+                    how, changed = "add", [o for o in q["options"] if o in current or o == opt]
+            elif opt == current:
+                continue
+            else:
+                how, changed = "set", opt
+            survey = fix_visibility({**answers, q["text"]: changed}, rng, catalog)
+            yield q["id"], opt, how, survey
+
+
+def top_technique(ranked: list[dict]) -> str | None:
+    techniques, _ = split_policies(ranked)
+    return techniques[0]["name"] if techniques else None
+
+
+def sensitivity_chunk(surveys: list[dict], rng: random.Random, engine: ScoringEngine,
+                      validator: SurveyValidator) -> dict:
+    # How often does changing one answer change the top-ranked technique?
+    catalog = active_rules().catalog
+    top, q_trials, q_flips, a_trials, a_flips = Counter(), Counter(), Counter(), Counter(), Counter()
+    for answers in surveys:
+        variants = list(perturbations(answers, rng, catalog))
+        results = engine.score_batch(
+            [validator.parse(answers)[1]] + [validator.parse(v[3])[1] for v in variants]
+        )
+        base = top_technique(results[0][0])
+        top[base] += 1
+        for (qid, opt, how, _), (ranked, _, _) in zip(variants, results[1:]):
+            flipped = top_technique(ranked) != base
+            q_trials[qid] += 1
+            q_flips[qid] += flipped
+            a_trials[qid, opt, how] += 1
+            a_flips[qid, opt, how] += flipped
+    return {"surveys": len(surveys), "top": top, "q_trials": q_trials, "q_flips": q_flips,
+            "a_trials": a_trials, "a_flips": a_flips}
+
+
+def _sensitivity_task(task) -> dict:
+    # (seed, n) samples n surveys in the worker; a list is scored as given
+    seed, surveys = task
+    rng = random.Random(seed)
+    if isinstance(surveys, int):
+        surveys = [sample_answers(rng, active_rules().catalog) for _ in range(surveys)]
+    rules = active_rules()
+    return sensitivity_chunk(surveys, rng, _pool_engine or rules.engine,
+                             _pool_validator or rules.validator)
+
+
+def merge_sensitivity(parts) -> dict:
+    total = {"surveys": 0, "top": Counter(), "q_trials": Counter(), "q_flips": Counter(),
+             "a_trials": Counter(), "a_flips": Counter()}
+    for part in parts:
+        total["surveys"] += part["surveys"]
+        for key in ("top", "q_trials", "q_flips", "a_trials", "a_flips"):
+            total[key].update(part[key])
+    return total
+
+
+def sensitivity_report(stats: dict, catalog: QuestionCatalog) -> dict:
+    def rate(flips, trials):
+        return round(flips / trials, 4) if trials else 0.0
+
+    questions = sorted(
+        ({"id": qid, "text": catalog.id_to_text[qid], "trials": n,
+          "flip_rate": rate(stats["q_flips"][qid], n)}
+         for qid, n in stats["q_trials"].items()),
+        key=lambda r: -r["flip_rate"],
+    )
+    answers = sorted(
+        ({"id": qid, "option": opt, "change": how, "trials": n,
+          "flip_rate": rate(stats["a_flips"][qid, opt, how], n)}
+         for (qid, opt, how), n in stats["a_trials"].items()),
+        key=lambda r: -r["flip_rate"],
+    )
+    return {
+        "surveys":   stats["surveys"],
+        "top":       {name or "(none)": n for name, n in stats["top"].most_common()},
+        "questions": questions,
+        "answers":   answers,
+    }
+
+
+def common_answer_sets(db_path: str, keep: int, validator: SurveyValidator) -> dict:
+    # the `keep` most frequent canonical answer sets in the submission log;
+    # ones the current rules reject (logged under older rules) are skipped
+    counts, rows_of = Counter(), {}
+    for rec in read_submissions(db_path):
+        try:
+            rows = validator.parse(rec["answers"])[1]
+        except PayloadError:
+            continue
+        digest = answers_digest(rows)
+        counts[digest] += 1
+        rows_of.setdefault(digest, rows)
+    return {digest: rows_of[digest] for digest, _ in counts.most_common(keep)}
+
+
+def write_precomputed(entries: dict, version: str, path: Path = PRECOMPUTED_FILE):
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "wb") as fh:
+        pickle.dump({"format": PRECOMPUTED_FORMAT, "rules": version, "entries": entries},
+                    fh, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+def cmd_precompute(args):
+    rules = active_rules()
+    catalog, engine = rules.catalog, rules.engine
+    size = answer_space_size(catalog)
+    exhaustive = size <= args.max_exhaustive
+
+    if exhaustive:
+        print(f"answer space: {size} reachable surveys, enumerating all", file=sys.stderr)
+        tasks = enumerate(chunked(enumerate_answers(catalog), args.chunk_size))
+    else:
+        print(f"answer space: {size:.3g} reachable surveys, sampling {args.samples}",
+              file=sys.stderr)
+        tasks = [(seed, min(args.chunk_size, args.samples - start))
+                 for seed, start in enumerate(range(0, args.samples, args.chunk_size), args.seed)]
+
+    start = time.perf_counter()
+    if args.workers <= 1:
+        stats = merge_sensitivity(map(_sensitivity_task, tasks))
+    else:
+        with scoring_pool(args.workers) as pool:
+            stats = merge_sensitivity(imap_bounded(pool, _sensitivity_task, tasks, 2 * args.workers))
+    print(f"scored {stats['surveys']} surveys and their one-answer variants "
+          f"in {time.perf_counter() - start:.1f} s", file=sys.stderr)
+
+    report = sensitivity_report(stats, catalog)
+    if args.report:
+        with open_stream(args.report, "w") as fh:
+            json.dump(report, fh, ensure_ascii=False, indent=2)
+            fh.write("\n")
+    print("most influential questions (share of one-answer changes that move the top PET):",
+          file=sys.stderr)
+    for q in report["questions"][:10]:
+        print(f"  {q['id']:>4} {q['flip_rate']:7.1%}  {q['text'][:70]}", file=sys.stderr)
+
+    # lookup table: the whole space when it was enumerated, else what the
+    # submission log says people actually answer
+    if exhaustive:
+        chosen = {}
+        for answers in enumerate_answers(catalog):
+            rows = rules.validator.parse(answers)[1]
+            chosen[answers_digest(rows)] = rows
+    elif args.log and Path(args.log).exists():
+        chosen = common_answer_sets(args.log, args.keep, rules.validator)
+    else:
+        chosen = {}
+    entries = {}
+    for batch in chunked(chosen.items(), args.chunk_size):
+        results = engine.score_batch([rows for _, rows in batch])
+        entries.update((digest, result) for (digest, _), result in zip(batch, results))
+    if not entries:
+        # nothing to serve; keep whatever table is there rather than blank it
+        print(f"no answer sets to precompute (no submission log, space not enumerated); "
+              f"left {args.out} as it was", file=sys.stderr)
+        return
+    write_precomputed(entries, rules.version, args.out)
+    print(f"wrote {args.out} ({len(entries)} answer sets, rules {rules.version})", file=sys.stderr)
+
+
+# -----------------------------------------------------------------------------
+# Command line
+# -----------------------------------------------------------------------------
+def cli_axis(name: str, text: str, integer: bool) -> np.ndarray:
+    # "a,b,c", or "start:stop:num" (floats) / "start:stop[:step]" (integers)
+    try:
+        if ":" in text:
+            parts = [float(p) for p in text.split(":")]
+            key = "step" if integer else "num"
+            spec = dict(zip(("start", "stop", key), parts))
+        else:
+            spec = [float(p) for p in text.split(",")]
+        return grid_axis(name, spec, integer)
+    except PayloadError as exc:
+        raise SystemExit(f"--{exc}")     # problems already start with the name
+    except ValueError:
+        raise SystemExit(f"--{name}: expected numbers, not {text!r}")
+
+
+def cmd_calc(args):
+    if args.calculator == "dp":
+        axes, values = dp_calculator(cli_axis("error", args.error, False),
+                                     cli_axis("queries", args.queries, True))
+    else:
+        axes, values = mpc_calculator(cli_axis("parties", args.parties, True),
+                                      cli_axis("corruptions", args.corruptions, True))
+    with open_stream(args.out, "w", newline="") as dst:
+        if args.format == "json":
+            json.dump(grid_json(axes, values), dst, ensure_ascii=False)
+            dst.write("\n")
+        else:
+            rows = grid_table(axes, values)
+            writer = csv.DictWriter(dst, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def cmd_compile(args):
+    snapshot = build_snapshot(args.source)
+    write_snapshot(snapshot, args.out)
+    rules = snapshot["rules"]
+    print(f"wrote {args.out} (version {snapshot['source'][:12]}, "
+          f"{len(rules['questions'])} questions, "
+          f"{sum(len(v) for v in rules['lookup'].values())} answers)")
+
+
+def cmd_build_assets(args):
+    for name, entry in build_assets(args.out).items():
+        print(f"{name} -> {args.out / entry['file']} ({entry['bytes']} bytes; "
+              f"{', '.join(entry['encodings']) or 'uncompressed'})")
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="PET Advisor offline jobs")
+    sub = parser.add_subparsers(dest="command")
+
+    sub.add_parser("serve", help="run the development server (default)")
+
+    p = sub.add_parser("compile", help="compile the spreadsheet into a rule snapshot")
+    p.add_argument("--source", type=Path, default=DATA_FILE)
+    p.add_argument("--out", type=Path, default=SNAPSHOT_FILE)
+    p.set_defaults(func=cmd_compile)
+
+    p = sub.add_parser("build-assets", help="minify, fingerprint and precompress static files")
+    p.add_argument("--out", type=Path, default=ASSET_DIR)
+    p.set_defaults(func=cmd_build_assets)
+
+    p = sub.add_parser("score", help="score a JSON Lines file of surveys")
+    p.add_argument("--in", dest="inp", default="-", help="input .jsonl ('-' = stdin)")
+    p.add_argument("--out", default="-", help="output .jsonl ('-' = stdout)")
+    p.add_argument("--chunk-size", type=int, default=1000)
+    p.add_argument("--workers", type=int, default=1, help="scoring processes (1 = in-process)")
+    p.set_defaults(func=cmd_score)
+
+    p = sub.add_parser("export", help="score surveys into a CSV/Parquet table plus per-technique totals")
+    p.add_argument("--in", dest="inp", default="-", help="input .jsonl ('-' = stdin)")
+    p.add_argument("--out", default="-", help="output table ('-' = stdout, CSV only)")
+    p.add_argument("--format", choices=("csv", "parquet"), help="default: from --out's suffix")
+    p.add_argument("--summary", help="write per-technique vote/veto totals here as JSON")
+    p.add_argument("--chunk-size", type=int, default=5000)
+    p.add_argument("--workers", type=int, default=1, help="scoring processes (1 = in-process)")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("submissions", help="dump the POST /results log as JSON Lines")
+    p.add_argument("--db", default=SUBMISSION_LOG, help="submission log database")
+    p.add_argument("--out", default="-", help="output .jsonl ('-' = stdout)")
+    p.add_argument("--since", help="only submissions at or after this ISO date/time")
+    p.add_argument("--rules", help="only submissions scored with this rules version")
+    p.add_argument("--with-results", action="store_true", help="include the logged ranking")
+    p.set_defaults(func=cmd_submissions)
+
+    p = sub.add_parser("precompute", help="sensitivity report + lookup table of common answer sets")
+    p.add_argument("--samples", type=int, default=20_000, help="surveys to sample when the space is too big")
+    p.add_argument("--max-exhaustive", type=int, default=200_000,
+                   help="enumerate every reachable survey up to this many")
+    p.add_argument("--log", default=SUBMISSION_LOG, help="submission log to mine for common answer sets")
+    p.add_argument("--keep", type=int, default=50_000, help="answer sets to keep in the lookup table")
+    p.add_argument("--out", type=Path, default=PRECOMPUTED_FILE)
+    p.add_argument("--report", help="write the sensitivity report here as JSON")
+    p.add_argument("--chunk-size", type=int, default=500)
+    p.add_argument("--workers", type=int, default=1, help="scoring processes (1 = in-process)")
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=cmd_precompute)
+
+    p = sub.add_parser("calc", help="DP budget / MPC threshold over a parameter grid")
+    calc = p.add_subparsers(dest="calculator", required=True)
+    c = calc.add_parser("dp", help="ε per query and per day for error × queries/day")
+    c.add_argument("--error", required=True, help="'a,b,c' or 'start:stop:num'")
+    c.add_argument("--queries", required=True, help="'a,b,c' or 'start:stop[:step]'")
+    c = calc.add_parser("mpc", help="protocol model for parties × tolerated corruptions")
+    c.add_argument("--parties", required=True, help="'a,b,c' or 'start:stop[:step]'")
+    c.add_argument("--corruptions", required=True, help="'a,b,c' or 'start:stop[:step]'")
+    for c in calc.choices.values():
+        c.add_argument("--format", choices=("csv", "json"), default="csv",
+                       help="csv: one row per cell; json: axes + heatmap arrays")
+        c.add_argument("--out", default="-", help="output file ('-' = stdout)")
+        c.set_defaults(func=cmd_calc)
+
+    args = parser.parse_args(argv)
+    if getattr(args, "func", None):
+        return args.func(args)
+    app.run(debug=True)
+
+
+if __name__ == "__main__":
+    main()
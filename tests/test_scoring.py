@@ -0,0 +1,97 @@
+# tests/test_scoring.py
+
+import io
+import random
+
+import pytest
+
+import app
+import bench
+import cli
+
+QUESTIONS = app.active_rules().catalog.questions
+SINGLE = next(q for q in QUESTIONS if not q["multi"])
+MULTI = next(q for q in QUESTIONS if q["multi"])
+
+
+@pytest.fixture(scope="module")
+def rules():
+    return app.active_rules()
+
+
+@pytest.fixture(scope="module")
+def surveys(rules):
+    # in question order, spelled as the validator canonicalizes them
+    rng = random.Random(0)
+    return [rules.validator.parse(bench.random_survey(rng))[0] for _ in range(300)]
+
+
+def by_name(vetoed):
+    return sorted(vetoed, key=lambda v: v["name"])
+
+
+def test_engine_matches_reference_scorer(surveys):
+    for answers in surveys:
+        want, got = bench.evaluate_dicts(answers), app.evaluate(answers)
+        assert got[:2] == want[:2]
+        assert by_name(got[2]) == by_name(want[2])
+
+
+def test_score_batch_matches_score(rules, surveys):
+    batch = [rules.validator.parse(answers)[1] for answers in surveys] + [[]]
+    assert rules.engine.score_batch(batch) == [rules.engine.score(rows) for rows in batch]
+
+
+def test_whatif_matches_full_evaluation(monkeypatch, surveys):
+    monkeypatch.setattr(app, "RESULT_STORE", app.MemoryResultStore(3600))
+    client = app.app.test_client()
+    rng = random.Random(1)
+    answers = dict(surveys[0])
+    token = client.post("/api/evaluate/diff", json={"answers": answers}).get_json()["token"]
+    for other in surveys[1:100]:
+        changes = {q: other[q] for q in rng.sample(sorted(other), min(2, len(other)))}
+        if answers and rng.random() < 0.3:
+            changes[rng.choice(sorted(answers))] = None
+        resp = client.post("/api/evaluate/diff", json={"token": token, "changes": changes})
+        assert resp.status_code == 200
+        token = resp.get_json()["token"]
+        for q, ans in changes.items():
+            if ans is None:
+                answers.pop(q, None)
+            else:
+                answers[q] = ans
+        state = app.RESULT_STORE.get(token)
+        assert (state["ranked"], state["params"], state["vetoed"]) == app.evaluate(answers)
+
+
+@pytest.mark.parametrize("payload, problem", [
+    (["not", "an", "object"], "expected an object of answers"),
+    ({"no such question": "x"}, "unknown question"),
+    ({SINGLE["text"]: "no such answer"}, "unknown answer"),
+    ({SINGLE["text"]: list(SINGLE["options"][:2])}, "expected one option"),
+    ({MULTI["text"]: [MULTI["options"][0]] * 2}, "repeated answer"),
+    ({SINGLE["text"]: SINGLE["options"][0], SINGLE["id"]: SINGLE["options"][0]}, "answered twice"),
+    ({SINGLE["text"]: 3}, "expected one option"),
+])
+def test_invalid_payloads_are_rejected_everywhere(rules, payload, problem):
+    with pytest.raises(app.PayloadError) as exc:
+        rules.validator.parse(payload)
+    assert any(problem in p for p in exc.value.problems)
+
+    resp = app.app.test_client().post("/api/evaluate", json=payload)
+    assert resp.status_code == 400
+    assert resp.get_json()["problems"] == exc.value.problems
+
+    assert cli.score_chunk([payload]) == [{"error": "invalid payload", "problems": exc.value.problems}]
+
+
+@pytest.mark.parametrize("chunked", [False, True])
+def test_oversized_body_is_413(chunked):
+    body = b"{" + b" " * app.SURVEY_MAX_BYTES + b"}"
+    if chunked:     # no Content-Length: werkzeug's cut-off must not read as bad JSON
+        kwargs = {"input_stream": io.BytesIO(body), "headers": {"Transfer-Encoding": "chunked"},
+                  "environ_overrides": {"wsgi.input_terminated": True}}
+    else:
+        kwargs = {"data": body}
+    resp = app.app.test_client().post("/api/evaluate", content_type="application/json", **kwargs)
+    assert resp.status_code == 413
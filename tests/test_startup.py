@@ -0,0 +1,14 @@
+# tests/test_startup.py
+
+import bench
+
+
+def test_cold_start_within_budget():
+    # a fresh interpreter imports the app and serves GET /, as a new worker does
+    report = bench.startup_probe()
+    assert report["status"] == 200
+    assert [name for name, depth, _ in report["phases"] if depth == 0][:1] == ["load_rules"]
+    assert report["cold_start_s"] <= bench.STARTUP_BUDGET, (
+        f"cold start {report['cold_start_s']:.2f} s is over the {bench.STARTUP_BUDGET} s budget "
+        f"(PETS_STARTUP_BUDGET); see `python bench.py startup`"
+    )